@@ -1,5 +1,9 @@
 from .sign import Signer, HeaderSigner
-from .verify import Verifier, HeaderVerifier
+from .verify import Verifier, HeaderVerifier, SignatureVerifier, verify_many
+from .keystore import KeyStore
+from .cache import VerificationCache
+from .replay import ReplayGuard, LocalReplayStore
+from .prevalidation import PreValidator, RequestRejected
 
 from ._version import get_versions
 __version__ = get_versions()['version']
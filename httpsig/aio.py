@@ -0,0 +1,110 @@
+"""
+asyncio front-end for signing and verifying.
+
+sign() and verify() return futures, so they can be awaited from coroutines.
+HMAC work runs inline on the event loop; RSA work is handed to a bounded executor
+so that it does not stall the loop. Under Python 2 the trollius backport is used.
+"""
+try:
+    import asyncio
+except ImportError:
+    import trollius as asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from .utils import HeaderView
+from .prevalidation import RequestRejected
+
+DEFAULT_MAX_WORKERS = 4
+
+_default_executor = None
+
+
+def set_default_executor(executor):
+    """Use executor for the RSA work of every call that does not pass its own."""
+    global _default_executor
+    _default_executor = executor
+
+
+def get_default_executor():
+    """Return the executor used for RSA work, creating a bounded thread pool on first use."""
+    global _default_executor
+    if _default_executor is None:
+        _default_executor = ThreadPoolExecutor(max_workers=DEFAULT_MAX_WORKERS)
+    return _default_executor
+
+
+def _settle(future, fn, *args):
+    """Resolve future with fn(*args), or with the exception it raised."""
+    if future.done():
+        return
+    try:
+        future.set_result(fn(*args))
+    except Exception as e:
+        future.set_exception(e)
+
+
+def _run(loop, executor, inline, fn, *args):
+    """Return a future for fn(*args), run inline or on executor (the default one if None)."""
+    if inline:
+        future = asyncio.Future(loop=loop)
+        _settle(future, fn, *args)
+        return future
+    return loop.run_in_executor(executor or get_default_executor(), fn, *args)
+
+
+def sign(signer, headers, host=None, method=None, path=None, executor=None, loop=None):
+    """
+    Sign headers with a HeaderSigner, returning a future of the signed header dict.
+
+    The arguments are those of HeaderSigner.sign; executor overrides the default executor for RSA.
+    """
+    loop = loop or asyncio.get_event_loop()
+    inline = signer.sign_algorithm == 'hmac'
+    return _run(loop, executor, inline, signer.sign, headers, host, method, path)
+
+
+def verify(engine, headers, method=None, path=None, host=None, key_fetcher=None, executor=None, loop=None):
+    """
+    Verify a request with a SignatureVerifier, returning a future of True or False.
+
+    The request arguments are those of SignatureVerifier.verify.
+    key_fetcher is an optional callable taking a keyId and returning an awaitable of its
+    secret (or of a (secret, algorithm) tuple, or of None if the keyId is unknown). It is
+    called only for keys the engine's KeyStore does not know yet, and its result is kept by
+    the KeyStore like those of its loader: for loader_ttl seconds, restricted to the algorithms
+    they fit if they are not pinned (see KeyStore).
+    executor overrides the default executor for RSA.
+    """
+    loop = loop or asyncio.get_event_loop()
+    result = asyncio.Future(loop=loop)
+    headers = HeaderView(headers)
+    try:
+        params, signable = engine._prepare(headers, method, path, host, check_key=key_fetcher is None)
+    except Exception as e:
+        result.set_exception(e)
+        return result
+
+    def check():
+        inline = params.algorithm.startswith('hmac-')
+        checked = _run(loop, executor, inline, engine._check_request, params, signable, headers)
+        checked.add_done_callback(lambda f: _settle(result, f.result))
+
+    def add_key(fetched):
+        try:
+            secret = fetched.result()
+            if secret is None:
+                raise RequestRejected('key_id', "Unknown key id.")
+            engine.keystore._remember(key_id, secret)
+        except Exception as e:
+            if not result.done():
+                result.set_exception(e)
+            return
+        check()
+
+    key_id = params.key_id
+    if key_fetcher is not None and key_id not in engine.keystore:
+        fetching = asyncio.ensure_future(key_fetcher(key_id), loop=loop)
+        fetching.add_done_callback(add_key)
+    else:
+        check()
+    return result
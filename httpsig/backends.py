@@ -0,0 +1,397 @@
+"""
+Crypto backends used by Signer and Verifier.
+
+A backend turns secrets into ready-to-use keys:
+load_rsa_key(secret, hash_algorithm, blinding='precomputed') returns an object with sign(data)
+and verify(data, signature), as do load_rsa_pss_key(secret, hash_algorithm),
+load_ecdsa_key(secret, hash_algorithm) and load_ed25519_key(secret) where supported;
+hmac(secret, hash_algorithm) returns an HMACKey, with mac(data) and verify(data, mac).
+There is one load_<scheme>_key method per asymmetric scheme of httpsig.utils.ALGORITHM_REGISTRY.
+
+RSA private keys are always held with their CRT components (p, q and the exponents and
+coefficient derived from them), checked once at load. blinding is one of BLINDINGS:
+'precomputed' blinds each signature with a factor pair drawn ahead of time and squared after
+each use, redrawn every few signatures (what OpenSSL does); 'random' draws a new factor for
+every signature (what pycrypto does). Signatures are always blinded, and only the pycrypto
+backend lets the strategy be chosen.
+
+Key objects are used from several threads at once and must be safe for it: OpenSSL keys are
+immutable once loaded, pycrypto RSA operations only read the key (the blinding factors and RNG
+are locked), and HMACKey only copies its precomputed hash states.
+
+The 'cryptography' backend (OpenSSL) is used when that package is installed,
+with 'pycrypto' as the fallback; only the former supports ecdsa and ed25519.
+"""
+import binascii
+import hashlib
+import threading
+
+from .utils import constant_time_compare, HttpSigException
+
+try:
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.backends import default_backend as _openssl_backend
+    from cryptography.hazmat.primitives import hashes as _hashes, serialization as _serialization
+    from cryptography.hazmat.primitives.asymmetric import padding as _padding, rsa as _rsa, ec as _ec, \
+        ed25519 as _ed25519
+except ImportError:
+    _openssl_backend = None
+
+
+# blinding strategies of RSA signatures, see above
+BLINDINGS = ('precomputed', 'random')
+
+# DER encoding of the DigestInfo of each hash, up to the digest (RFC 8017, section 9.2)
+_DIGEST_INFO_PREFIXES = {
+    'sha1': binascii.unhexlify('3021300906052b0e03021a05000414'),
+    'sha256': binascii.unhexlify('3031300d060960864801650304020105000420'),
+    'sha512': binascii.unhexlify('3051300d060960864801650304020305000440'),
+}
+
+_TRANS_5C = b''.join(chr(x ^ 0x5C) for x in range(256))
+_TRANS_36 = b''.join(chr(x ^ 0x36) for x in range(256))
+
+
+def _check_blinding(blinding):
+    if blinding not in BLINDINGS:
+        raise HttpSigException("Unknown blinding strategy.")
+
+
+def _check_pss_key_size(bits, digest_size):
+    # the encoded message holds the hash, a salt as long as it and two more bytes
+    if (bits + 6) // 8 < 2 * digest_size + 2:
+        raise HttpSigException("Key too small for RSA-PSS with this hash.")
+
+
+class HMACKey(object):
+    """
+    An HMAC key with its inner (ipad) and outer (opad) hash states computed once,
+    so that each MAC costs two hash finalizations and no key schedule.
+
+    digestmod is a hash constructor (e.g. hashlib.sha256); its objects need copy() and block_size.
+    The precomputed states are only ever copied, so one HMACKey can be shared between threads.
+    """
+    __slots__ = ('_inner', '_outer', 'digest_size', 'encoded_size')
+
+    def __init__(self, secret, digestmod):
+        inner = digestmod()
+        block_size = inner.block_size
+        if len(secret) > block_size:
+            secret = digestmod(secret).digest()
+        secret = secret.ljust(block_size, b'\0')
+        inner.update(secret.translate(_TRANS_36))
+        outer = digestmod()
+        outer.update(secret.translate(_TRANS_5C))
+        self._inner = inner
+        self._outer = outer
+        self.digest_size = inner.digest_size
+        # length of a base64-encoded MAC
+        self.encoded_size = 4 * ((self.digest_size + 2) // 3)
+
+    def mac(self, data):
+        """Return the HMAC of data."""
+        inner = self._inner.copy()
+        inner.update(data)
+        outer = self._outer.copy()
+        outer.update(inner.digest())
+        return outer.digest()
+
+    def verify(self, data, mac):
+        """Return whether mac is the HMAC of data, comparing in constant time."""
+        return constant_time_compare(self.mac(data), mac)
+
+
+class PyCryptoBackend(object):
+    """Backend built on pycrypto."""
+    name = 'pycrypto'
+
+    def __init__(self):
+        from Crypto.Hash import SHA, SHA256, SHA512
+        from Crypto.PublicKey import RSA
+        from Crypto.Signature import PKCS1_v1_5, PKCS1_PSS
+        self._RSA = RSA
+        self._PKCS1_v1_5 = PKCS1_v1_5
+        self._PKCS1_PSS = PKCS1_PSS
+        self._hashes = {'sha1': SHA, 'sha256': SHA256, 'sha512': SHA512}
+
+    def _import_rsa_key(self, secret):
+        try:
+            return self._RSA.importKey(secret)
+        except ValueError:
+            raise HttpSigException("Invalid key.")
+
+    def _crt_key(self, rsa_key):
+        """
+        Return the private rsa_key with its CRT components (p, q and u = 1/p mod q),
+        recovered from n, e and d if the key came without them, after checking them.
+        """
+        if not getattr(rsa_key.key, 'p', None):
+            # pycrypto factors n when only given n, e and d
+            rsa_key = self._RSA.construct((rsa_key.n, rsa_key.e, rsa_key.d))
+        n, e, d, p, q, u = rsa_key.n, rsa_key.e, rsa_key.d, rsa_key.p, rsa_key.q, rsa_key.u
+        if p * q != n or e * d % (p - 1) != 1 or e * d % (q - 1) != 1 or p * u % q != 1:
+            raise HttpSigException("Invalid key.")
+        # the CRT private operation must undo the public one
+        if pow(rsa_key.key._decrypt(2L), e, n) != 2:
+            raise HttpSigException("Invalid key.")
+        return rsa_key
+
+    def load_rsa_key(self, secret, hash_algorithm, blinding='precomputed'):
+        _check_blinding(blinding)
+        rsa_key = self._import_rsa_key(secret)
+        hash_module = self._hashes[hash_algorithm]
+        if not rsa_key.has_private():
+            return _PyCryptoRSAKey(self._PKCS1_v1_5.new(rsa_key), hash_module)
+        try:
+            rsa_key = self._crt_key(rsa_key)
+            pkcs1 = self._PKCS1_v1_5.new(rsa_key)
+            key = _PyCryptoRSASigningKey(pkcs1, hash_module, rsa_key, _DIGEST_INFO_PREFIXES[hash_algorithm],
+                                         blinding)
+            # the signing key relies on pycrypto internals: check it against PKCS1_v1_5 once
+            if key.sign(b'') != pkcs1.sign(hash_module.new(b'')):
+                raise AttributeError
+        except AttributeError:
+            raise HttpSigException("RSA signing is not supported by this pycrypto version.")
+        return key
+
+    def load_rsa_pss_key(self, secret, hash_algorithm):
+        # the salt is as long as the hash, and MGF1 uses the same hash
+        rsa_key = self._import_rsa_key(secret)
+        hash_module = self._hashes[hash_algorithm]
+        _check_pss_key_size(rsa_key.size() + 1, hash_module.digest_size)
+        return _PyCryptoRSAKey(self._PKCS1_PSS.new(rsa_key), hash_module)
+
+    def hmac(self, secret, hash_algorithm):
+        return HMACKey(secret, self._hashes[hash_algorithm].new)
+
+
+class _PyCryptoRSAKey(object):
+    def __init__(self, pkcs1, hash_module):
+        self._pkcs1 = pkcs1
+        self._hash = hash_module
+
+    def sign(self, data):
+        return self._pkcs1.sign(self._hash.new(data))
+
+    def verify(self, data, signature):
+        return bool(self._pkcs1.verify(self._hash.new(data), signature))
+
+
+class _PyCryptoRSASigningKey(_PyCryptoRSAKey):
+    """
+    PKCS#1 v1.5 signing on pycrypto's raw CRT private operation, with the padding up to the
+    digest precomputed and the blinding chosen at load.
+    """
+    # signatures made with a blinding factor pair before a new one is drawn, as in OpenSSL
+    BLINDING_REFRESH = 32
+
+    def __init__(self, pkcs1, hash_module, rsa_key, digest_info_prefix, blinding):
+        from Crypto.Util.number import getRandomRange
+        super(_PyCryptoRSASigningKey, self).__init__(pkcs1, hash_module)
+        self._rsa_key = rsa_key
+        self._getRandomRange = getRandomRange
+        self._n = rsa_key.n
+        # length of the modulus in bytes
+        self._size = (rsa_key.size() + 8) // 8
+        padding = self._size - len(digest_info_prefix) - hash_module.digest_size - 3
+        if padding < 8:
+            raise HttpSigException("Key too small for this hash.")
+        self._prefix = b'\x00\x01' + b'\xff' * padding + b'\x00' + digest_info_prefix
+        self._blinding = blinding
+        self._lock = threading.Lock()
+        self._factors = None
+        self._uses = self.BLINDING_REFRESH
+
+    def _draw_factors(self):
+        """Return a random blinding factor raised to e, and its inverse, mod n."""
+        r = self._getRandomRange(1, self._n - 1, randfunc=self._rsa_key._randfunc)
+        # pycrypto's own (C) blinding arithmetic
+        return self._rsa_key.key._blind(1L, r), self._rsa_key.key._unblind(1L, r)
+
+    def _next_factors(self):
+        n = self._n
+        with self._lock:
+            if self._uses == self.BLINDING_REFRESH:
+                self._factors = self._draw_factors()
+                self._uses = 0
+            blind, unblind = self._factors
+            self._factors = (blind * blind % n, unblind * unblind % n)
+            self._uses += 1
+        return blind, unblind
+
+    def sign(self, data):
+        n = self._n
+        m = long(binascii.hexlify(self._prefix + self._hash.new(data).digest()), 16)
+        if self._blinding == 'precomputed':
+            blind, unblind = self._next_factors()
+        else:
+            blind, unblind = self._draw_factors()
+        s = self._rsa_key.key._decrypt(m * blind % n) * unblind % n
+        return binascii.unhexlify('%0*x' % (2 * self._size, s))
+
+
+class CryptographyBackend(object):
+    """Backend built on cryptography (OpenSSL) for RSA and on hashlib for HMAC."""
+    name = 'cryptography'
+
+    def __init__(self):
+        if _openssl_backend is None:
+            raise ImportError("cryptography is not installed")
+        self._backend = _openssl_backend()
+        self._hashes = {'sha1': _hashes.SHA1, 'sha256': _hashes.SHA256, 'sha512': _hashes.SHA512}
+        self._digests = {'sha1': hashlib.sha1, 'sha256': hashlib.sha256, 'sha512': hashlib.sha512}
+
+    def _load_key(self, secret):
+        if isinstance(secret, unicode):
+            # e.g. keys read from JSON or YAML configuration; PEM and OpenSSH keys are ASCII
+            try:
+                secret = secret.encode('ascii')
+            except UnicodeEncodeError:
+                raise HttpSigException("Invalid key.")
+        try:
+            if secret.startswith('ssh-'):
+                return _serialization.load_ssh_public_key(secret, self._backend)
+            try:
+                return _serialization.load_pem_private_key(secret, None, self._backend)
+            except (ValueError, TypeError):
+                pass
+            return _serialization.load_pem_public_key(secret, self._backend)
+        except (ValueError, TypeError):
+            raise HttpSigException("Invalid key.")
+
+    def _load_rsa_key(self, secret):
+        key = self._load_key(secret)
+        if not isinstance(key, (_rsa.RSAPrivateKey, _rsa.RSAPublicKey)):
+            raise HttpSigException("Invalid key.")
+        return key
+
+    def load_rsa_key(self, secret, hash_algorithm, blinding='precomputed'):
+        # OpenSSL checks private keys (RSA_check_key) when loading them, and always blinds
+        _check_blinding(blinding)
+        if blinding != 'precomputed':
+            raise HttpSigException("The cryptography backend only supports precomputed blinding.")
+        return _CryptographyRSAKey(self._load_rsa_key(secret), _padding.PKCS1v15(), self._hashes[hash_algorithm]())
+
+    def load_rsa_pss_key(self, secret, hash_algorithm):
+        key = self._load_rsa_key(secret)
+        hash_algorithm = self._hashes[hash_algorithm]()
+        _check_pss_key_size(key.key_size, hash_algorithm.digest_size)
+        # the salt is as long as the hash, and MGF1 uses the same hash
+        pss = _padding.PSS(mgf=_padding.MGF1(hash_algorithm), salt_length=hash_algorithm.digest_size)
+        return _CryptographyRSAKey(key, pss, hash_algorithm)
+
+    def load_ecdsa_key(self, secret, hash_algorithm):
+        # P-256 only, the curve matching SHA-256; the point is decoded (and decompressed) here, once
+        key = self._load_key(secret)
+        if not isinstance(key, (_ec.EllipticCurvePrivateKey, _ec.EllipticCurvePublicKey)) \
+                or not isinstance(key.curve, _ec.SECP256R1):
+            raise HttpSigException("Invalid key.")
+        return _CryptographyECDSAKey(key, _ec.ECDSA(self._hashes[hash_algorithm]()))
+
+    def load_ed25519_key(self, secret):
+        key = self._load_key(secret)
+        if not isinstance(key, (_ed25519.Ed25519PrivateKey, _ed25519.Ed25519PublicKey)):
+            raise HttpSigException("Invalid key.")
+        return _CryptographyEd25519Key(key)
+
+    def hmac(self, secret, hash_algorithm):
+        return HMACKey(secret, self._digests[hash_algorithm])
+
+
+class _CryptographyRSAKey(object):
+    def __init__(self, key, padding, hash_algorithm):
+        self._private = key if hasattr(key, 'sign') else None
+        self._public = key.public_key() if self._private is not None else key
+        self._padding = padding
+        self._hash = hash_algorithm
+
+    def sign(self, data):
+        if self._private is None:
+            raise HttpSigException("Private key not available.")
+        return self._private.sign(data, self._padding, self._hash)
+
+    def verify(self, data, signature):
+        try:
+            self._public.verify(signature, data, self._padding, self._hash)
+        except InvalidSignature:
+            return False
+        return True
+
+
+class _CryptographyECDSAKey(object):
+    # signatures are DER-encoded (r, s) pairs
+    def __init__(self, key, ecdsa):
+        self._private = key if hasattr(key, 'sign') else None
+        self._public = key.public_key() if self._private is not None else key
+        self._ecdsa = ecdsa
+
+    def sign(self, data):
+        if self._private is None:
+            raise HttpSigException("Private key not available.")
+        return self._private.sign(data, self._ecdsa)
+
+    def verify(self, data, signature):
+        try:
+            self._public.verify(signature, data, self._ecdsa)
+        except InvalidSignature:
+            return False
+        return True
+
+
+class _CryptographyEd25519Key(object):
+    # unlike the other OpenSSL keys, these only take bytes, not bytearrays (see render_raw)
+    def __init__(self, key):
+        self._private = key if hasattr(key, 'sign') else None
+        self._public = key.public_key() if self._private is not None else key
+
+    def sign(self, data):
+        if self._private is None:
+            raise HttpSigException("Private key not available.")
+        return self._private.sign(bytes(data))
+
+    def verify(self, data, signature):
+        try:
+            self._public.verify(signature, bytes(data))
+        except InvalidSignature:
+            return False
+        return True
+
+
+BACKENDS = {
+    'cryptography': CryptographyBackend,
+    'pycrypto': PyCryptoBackend,
+}
+
+# in order of preference
+_PREFERRED = ('cryptography', 'pycrypto')
+
+_instances = {}
+
+
+def get_backend(name=None):
+    """
+    Return the backend called name ('cryptography' or 'pycrypto'),
+    or the preferred one installed if name is None.
+    """
+    for candidate in (name,) if name else _PREFERRED:
+        if candidate not in _instances:
+            try:
+                _instances[candidate] = BACKENDS[candidate]()
+            except ImportError:
+                if name:
+                    raise
+                continue
+        return _instances[candidate]
+    raise ImportError("No crypto backend available; install cryptography or pycrypto.")
+
+
+def available_backends():
+    """Return the names of the installed backends, in order of preference."""
+    names = []
+    for name in _PREFERRED:
+        try:
+            get_backend(name)
+        except ImportError:
+            continue
+        names.append(name)
+    return names
@@ -0,0 +1,619 @@
+"""
+Benchmarks for the signing and verification hot paths.
+
+``python -m httpsig.bench`` runs the suite: every algorithm, RSA key sizes, header counts
+and the HTTPSignatureAuth path, reporting ops/s and p50/p99 latency per operation.
+``--json`` prints the results as JSON, to compare runs between commits.
+``--compare`` runs the micro-benchmarks comparing former implementations with current ones.
+"""
+import argparse
+import base64
+import gc
+import json
+import os
+import sys
+import hmac
+import hashlib
+import tempfile
+import threading
+import timeit
+
+from .backends import available_backends, get_backend, BLINDINGS
+from .digest import digest_file
+from .keystore import KeyStore
+from .prevalidation import RequestRejected
+from .sign import HeaderSigner, Signer
+from .verify import Verifier, HeaderVerifier, SignatureVerifier
+from .utils import ALGORITHMS, get_algorithm, parse_signature_params, _parse_signature_params, SigningStringTemplate, CaseInsensitiveDict, HeaderView
+
+KEY_DIR = os.path.join(os.path.dirname(__file__), 'tests')
+HMAC_SECRET = 'something special goes here'
+
+
+def _read_key(name):
+    with open(os.path.join(KEY_DIR, name), 'r') as f:
+        return f.read()
+
+
+_rsa_keys = {}
+
+
+def _rsa_keypair(bits):
+    """Return a (private PEM, public PEM) RSA key pair of the given size, generated once per run."""
+    if bits not in _rsa_keys:
+        from Crypto.PublicKey import RSA
+        key = RSA.generate(bits)
+        _rsa_keys[bits] = (key.exportKey(), key.publickey().exportKey())
+    return _rsa_keys[bits]
+
+
+def _usec_per_op(fn, ops, repeat=3):
+    """Best-of-repeat wall time of one fn() call, divided by the number of operations it performs."""
+    return min(timeit.repeat(fn, number=1, repeat=repeat)) * 1e6 / ops
+
+
+def _request_headers(count):
+    return [{
+        'Host': 'example.com',
+        'Date': 'Thu, 05 Jan 2012 21:31:40 GMT',
+        'Content-Type': 'application/json',
+        'X-Request-Id': str(i),
+    } for i in range(count)]
+
+
+def bench_sign_many(batch_size=2000):
+    """HeaderSigner.sign in a loop against HeaderSigner.sign_many over the same batch."""
+    secrets = [('hmac-sha256', HMAC_SECRET), ('rsa-sha256', _read_key('rsa_private.pem'))]
+    for algorithm, secret in secrets:
+        hs = HeaderSigner(key_id='bench', secret=secret, algorithm=algorithm,
+                          headers=['(request-line)', 'host', 'date', 'x-request-id'])
+        n = batch_size if algorithm.startswith('hmac') else batch_size // 20
+        batch = _request_headers(n)
+        requests = [(h, None, 'GET', '/resource') for h in batch]
+
+        def loop():
+            for h in batch:
+                hs.sign(h, method='GET', path='/resource')
+
+        def many():
+            for _ in hs.sign_many(requests):
+                pass
+
+        yield ('sign loop %s' % algorithm, _usec_per_op(loop, n))
+        yield ('sign_many %s' % algorithm, _usec_per_op(many, n))
+
+
+def _legacy_parse_auth(auth):
+    # the split-based parser used before parse_signature_params
+    s, param_str = auth.split(' ', 1)
+    param_pairs = [p.split('=', 1) for p in param_str.split(',')]
+    return {k: v.strip('"') for k, v in param_pairs}
+
+
+def bench_parse_auth(number=20000):
+    """Authorization header parsing: split-based parser, single-pass parser, memoized parser."""
+    hs = HeaderSigner(key_id='bench', secret=HMAC_SECRET, algorithm='hmac-sha256',
+                      headers=['(request-line)', 'host', 'date', 'x-request-id'])
+    auth = hs.sign(_request_headers(1)[0], method='GET', path='/resource')['Authorization']
+    yield ('parse_auth split', _usec_per_op(lambda: [_legacy_parse_auth(auth) for _ in range(number)], number))
+    yield ('parse_auth single-pass', _usec_per_op(lambda: [_parse_signature_params(auth) for _ in range(number)], number))
+    yield ('parse_auth memoized', _usec_per_op(lambda: [parse_signature_params(auth) for _ in range(number)], number))
+
+
+def _legacy_generate_message(required_headers, headers, host=None, method=None, path=None):
+    # generate_message as it was before SigningStringTemplate
+    headers = CaseInsensitiveDict(headers)
+    signable_list = []
+    for h in required_headers:
+        if h == '(request-line)':
+            signable_list.append('%s: %s %s' % (h, method.lower(), path))
+        elif h == 'host':
+            signable_list.append('%s: %s' % (h.lower(), host or headers[h]))
+        else:
+            signable_list.append('%s: %s' % (h.lower(), headers[h]))
+    return '\n'.join(signable_list)
+
+
+def bench_signing_string(number=20000):
+    """Signing string construction for 1, 5 and 20 signed headers: per-call generate_message against a compiled template."""
+    for count in (1, 5, 20):
+        names = ['(request-line)', 'host'] + ['x-header-%d' % i for i in range(count - 2)] if count > 2 else ['date']
+        headers = _request_headers(1)[0]
+        headers.update(('X-Header-%d' % i, 'value %d' % i) for i in range(count))
+        template = SigningStringTemplate(names)
+        args = (headers, None, 'GET', '/resource')
+        yield ('generate_message %d headers' % count,
+               _usec_per_op(lambda: [_legacy_generate_message(names, *args) for _ in range(number)], number))
+        yield ('SigningStringTemplate %d headers' % count,
+               _usec_per_op(lambda: [template.render(*args) for _ in range(number)], number))
+
+
+def bench_sign_raw(number=5000):
+    """HeaderSigner.sign on a header dict against HeaderSigner.sign_raw on the same headers as raw byte pairs."""
+    hs = HeaderSigner(key_id='bench', secret=HMAC_SECRET, algorithm='hmac-sha256',
+                      headers=['(request-line)', 'host', 'date', 'x-request-id'])
+    headers = _request_headers(1)[0]
+    raw_headers = [(k.lower(), v) for k, v in headers.items()]
+    yield ('sign dict hmac-sha256', _usec_per_op(
+        lambda: [hs.sign(headers, method='GET', path='/resource') for _ in range(number)], number))
+    yield ('sign_raw hmac-sha256', _usec_per_op(
+        lambda: [hs.sign_raw(raw_headers, method=b'GET', path=b'/resource') for _ in range(number)], number))
+
+
+def bench_header_view(number=5000):
+    """A 50-header request with 3 signed headers: CaseInsensitiveDict copies against a HeaderView."""
+    names = ['host', 'date', 'x-request-id']
+    headers = _request_headers(1)[0]
+    headers.update(('X-Filler-%d' % i, 'x' * 200) for i in range(50 - len(headers)))
+    template = SigningStringTemplate(names)
+    hs = HeaderSigner(key_id='bench', secret=HMAC_SECRET, algorithm='hmac-sha256', headers=names)
+    yield ('CaseInsensitiveDict 50 headers', _usec_per_op(
+        lambda: [_legacy_generate_message(names, CaseInsensitiveDict(headers)) for _ in range(number)], number))
+    yield ('HeaderView 50 headers', _usec_per_op(
+        lambda: [template.render(HeaderView(headers)) for _ in range(number)], number))
+    yield ('sign 50 headers hmac-sha256', _usec_per_op(
+        lambda: [hs.sign(headers) for _ in range(number)], number))
+    yield ('authorization 50 headers hmac-sha256', _usec_per_op(
+        lambda: [hs.authorization(headers) for _ in range(number)], number))
+
+
+def bench_backends(number=20):
+    """RSA sign and verify with each installed backend, for 1024, 2048 and 4096 bit keys."""
+    data = 'date: Thu, 05 Jan 2012 21:31:40 GMT'
+    for bits in (1024, 2048, 4096):
+        private_key, public_key = _rsa_keypair(bits)
+        for backend in available_backends():
+            signer = Signer(private_key, 'rsa-sha256', backend=backend)
+            verifier = Verifier(public_key, 'rsa-sha256', backend=backend)
+            signature = signer._sign(data)
+            yield ('rsa-sha256 %d sign %s' % (bits, backend),
+                   _usec_per_op(lambda: [signer._sign(data) for _ in range(number)], number))
+            yield ('rsa-sha256 %d verify %s' % (bits, backend),
+                   _usec_per_op(lambda: [verifier._verify(data, signature) for _ in range(number)], number))
+
+
+def bench_file_digest(sizes=(1 << 20, 64 << 20, 256 << 20)):
+    """
+    SHA-256 Digest of a file on disk: chunked reads against digest_file (mmap).
+    Pass sizes=(..., 4 << 30) to include multi-GB files; they are written to a temporary file first.
+    """
+    for size in sizes:
+        with tempfile.NamedTemporaryFile() as f:
+            block = os.urandom(1 << 20)
+            for _ in range(size // len(block)):
+                f.write(block)
+            f.write(block[:size % len(block)])
+            f.flush()
+
+            def chunked():
+                h = hashlib.sha256()
+                with open(f.name, 'rb') as body:
+                    for chunk in iter(lambda: body.read(64 * 1024), b''):
+                        h.update(chunk)
+                return h.digest()
+
+            label = '%d MB' % (size >> 20)
+            yield ('file digest chunked %s' % label, _usec_per_op(chunked, 1))
+            yield ('file digest mmap %s' % label, _usec_per_op(lambda: digest_file(f.name), 1))
+
+
+def bench_requests_auth(number=5000):
+    """HTTPSignatureAuth on a prepared request: the former urlparse + sign + update path against the current one."""
+    try:
+        import requests
+        from urlparse import urlparse
+        from .requests_auth import HTTPSignatureAuth
+    except ImportError:
+        return
+    names = ['(request-line)', 'host', 'date']
+    auth = HTTPSignatureAuth(key_id='bench', secret=HMAC_SECRET, headers=names)
+    r = requests.Request('GET', 'https://example.com/resource?id=1',
+                         headers={'Date': 'Thu, 05 Jan 2012 21:31:40 GMT'}).prepare()
+
+    def legacy():
+        headers = auth.header_signer.sign(r.headers, host=urlparse(r.url).netloc, method=r.method, path=r.path_url)
+        r.headers.update(headers)
+
+    yield ('HTTPSignatureAuth legacy hmac-sha256', _usec_per_op(
+        lambda: [legacy() for _ in range(number)], number))
+    yield ('HTTPSignatureAuth hmac-sha256', _usec_per_op(
+        lambda: [auth(r) for _ in range(number)], number))
+
+
+def bench_hmac_verify(number=100000):
+    """
+    hmac-sha256 verification: a fresh hmac.new per request and a Verifier built per request,
+    against the precomputed key held by a KeyStore.
+    """
+    data = 'date: Thu, 05 Jan 2012 21:31:40 GMT'
+    signature = Signer(HMAC_SECRET, 'hmac-sha256')._sign(data)
+    mac = base64.b64decode(signature)
+    keystore = KeyStore({'bench': HMAC_SECRET})
+    yield ('hmac.new + == hmac-sha256', _usec_per_op(
+        lambda: [hmac.new(HMAC_SECRET, data, hashlib.sha256).digest() == mac for _ in range(number)],
+        number, repeat=1))
+    yield ('Verifier per request hmac-sha256', _usec_per_op(
+        lambda: [Verifier(HMAC_SECRET, 'hmac-sha256')._verify(data, signature) for _ in range(number)],
+        number, repeat=1))
+    yield ('KeyStore verifier hmac-sha256', _usec_per_op(
+        lambda: [keystore.get_verifier('bench', 'hmac-sha256')._verify(data, signature) for _ in range(number)],
+        number, repeat=1))
+    junk = 'x' * 200
+    yield ('KeyStore verifier junk signature hmac-sha256', _usec_per_op(
+        lambda: [keystore.get_verifier('bench', 'hmac-sha256')._verify(data, junk) for _ in range(number)],
+        number, repeat=1))
+
+
+def bench_prevalidation(number=5000):
+    """
+    Cost of turning away a bad rsa-sha256 request: HeaderVerifier, which imports the key first,
+    against a SignatureVerifier rejecting it in each PreValidator stage.
+    """
+    public_key = _read_key('rsa_public.pem')
+    engine = SignatureVerifier(KeyStore({'bench': public_key}), required_headers=['date', 'x-request-id'],
+                               algorithms=['rsa-sha256'])
+    base = {'Date': 'Thu, 05 Jan 2012 21:31:40 GMT', 'X-Request-Id': '1'}
+    auth = 'Signature keyId="%s",algorithm="%s",headers="%s",signature="c2lnbmF0dXJl"'
+    requests = [
+        ('syntax', dict(base, Authorization='Signature keyId="bench"')),
+        ('algorithm', dict(base, Authorization=auth % ('bench', 'hmac-sha1', 'date x-request-id'))),
+        ('key_id', dict(base, Authorization=auth % ('unknown', 'rsa-sha256', 'date x-request-id'))),
+        ('headers', dict(base, Authorization=auth % ('bench', 'rsa-sha256', 'date'))),
+    ]
+
+    def reject(headers):
+        try:
+            engine.verify(headers)
+        except RequestRejected:
+            pass
+
+    junk = requests[2][1]
+    yield ('HeaderVerifier bad signature rsa-sha256', _usec_per_op(
+        lambda: [HeaderVerifier(junk, secret=public_key).verify() for _ in range(number // 10)], number // 10))
+    for stage, headers in requests:
+        yield ('reject at %s' % stage, _usec_per_op(lambda: [reject(headers) for _ in range(number)], number))
+
+
+def bench_metrics_overhead(number=20000):
+    """hmac-sha256 signing and verification with no Metrics registered, and with a no-op one."""
+    from . import metrics
+    hs = HeaderSigner(key_id='bench', secret=HMAC_SECRET, algorithm='hmac-sha256', headers=['date'])
+    engine = SignatureVerifier(KeyStore({'bench': HMAC_SECRET}))
+    headers = {'Date': 'Thu, 05 Jan 2012 21:31:40 GMT'}
+    signed = dict(headers, Authorization=hs.authorization(headers))
+    for label, registered in (('no metrics', None), ('no-op metrics', metrics.Metrics())):
+        metrics.set_metrics(registered)
+        try:
+            yield ('authorization hmac-sha256, %s' % label, _usec_per_op(
+                lambda: [hs.authorization(headers) for _ in range(number)], number))
+            yield ('SignatureVerifier hmac-sha256, %s' % label, _usec_per_op(
+                lambda: [engine.verify(signed) for _ in range(number)], number))
+        finally:
+            metrics.set_metrics(None)
+
+
+def _stand_in_server():
+    """Start a local keep-alive HTTP server answering 204 to every GET; return (server, base URL)."""
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # send each response in one write, without waiting on delayed ACKs
+        wbufsize = -1
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingMixIn, HTTPServer):
+        daemon_threads = True
+
+    server = Server(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server, 'http://127.0.0.1:%d' % server.server_address[1]
+
+
+def bench_signed_session(threads=8, number=200):
+    """
+    Signed GETs to a local stand-in server from several threads: a new HTTPSignatureAuth and
+    connection per call against one shared SignedSession. Reports wall time per request.
+    """
+    try:
+        import requests
+        from .requests_auth import HTTPSignatureAuth, SignedSession
+    except ImportError:
+        return
+    names = ['(request-line)', 'host', 'date']
+    date = {'Date': 'Thu, 05 Jan 2012 21:31:40 GMT'}
+    server, url = _stand_in_server()
+    session = SignedSession('bench', HMAC_SECRET, headers=names, pool_maxsize=threads)
+    session.headers.update(date)
+
+    def per_call():
+        auth = HTTPSignatureAuth(key_id='bench', secret=HMAC_SECRET, headers=names)
+        requests.get(url + '/resource', auth=auth, headers=date)
+
+    def in_threads(fn):
+        def run():
+            workers = [threading.Thread(target=lambda: [fn() for _ in range(number)]) for _ in range(threads)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        return run
+
+    try:
+        yield ('requests.get + new auth, %d threads' % threads,
+               _usec_per_op(in_threads(per_call), threads * number, repeat=1))
+        yield ('SignedSession, %d threads' % threads,
+               _usec_per_op(in_threads(lambda: session.get(url + '/resource')), threads * number, repeat=1))
+    finally:
+        session.close()
+        server.shutdown()
+        server.server_close()
+
+
+BENCHMARKS = [bench_sign_many, bench_parse_auth, bench_signing_string, bench_sign_raw, bench_header_view,
+              bench_backends, bench_file_digest, bench_requests_auth,
+              bench_signed_session, bench_hmac_verify,
+              bench_prevalidation, bench_metrics_overhead]
+
+
+def _gc_objects(fn, number):
+    """
+    Average number of objects tracked by the garbage collector that a fn() call leaves
+    allocated (allocations less deallocations, the count that triggers collections),
+    over number calls made with the collector disabled.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    gc.collect()
+    try:
+        before = gc.get_count()[0]
+        for _ in range(number):
+            fn()
+        return float(gc.get_count()[0] - before) / number
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def measure(name, group, fn, min_time=0.2, min_ops=20, max_ops=100000):
+    """
+    Time fn() call by call, for at least min_time seconds and min_ops calls (at most max_ops),
+    and return the result record of the suite.
+    """
+    timer = timeit.default_timer
+    fn()  # warm up caches
+    samples = []
+    start = timer()
+    while len(samples) < max_ops:
+        t = timer()
+        fn()
+        samples.append(timer() - t)
+        if len(samples) >= min_ops and t - start >= min_time:
+            break
+    samples.sort()
+    return {
+        'name': name,
+        'group': group,
+        'ops': len(samples),
+        'ops_per_sec': len(samples) / sum(samples),
+        'p50_us': _percentile(samples, 0.50) * 1e6,
+        'p99_us': _percentile(samples, 0.99) * 1e6,
+        'gc_objects_per_op': _gc_objects(fn, min(len(samples), 1000)),
+    }
+
+
+SIGNING_STRING = '(request-line): get /resource\nhost: example.com\ndate: Thu, 05 Jan 2012 21:31:40 GMT'
+RSA_KEY_SIZES = (1024, 2048, 3072, 4096)
+HEADER_COUNTS = (1, 5, 10, 20, 30)
+
+
+def _secrets(algorithm, bits=None):
+    """(signing secret, verification secret) for algorithm; the test key pair for RSA unless bits is given."""
+    if algorithm in ('ed25519', 'ecdsa-sha256'):
+        scheme = get_algorithm(algorithm)[0]
+        return _read_key('%s_private.pem' % scheme), _read_key('%s_public.pem' % scheme)
+    if not algorithm.startswith('rsa'):
+        return HMAC_SECRET, HMAC_SECRET
+    if bits is None and algorithm.startswith('rsa-pss'):
+        # the 1024 bits key is too small for PSS with SHA-512
+        return _read_key('rsa2048_private.pem'), _read_key('rsa2048_public.pem')
+    if bits is None:
+        return _read_key('rsa_private.pem'), _read_key('rsa_public.pem')
+    return _rsa_keypair(bits)
+
+
+def _sign_verify(algorithm, bits=None):
+    """Case factories timing Signer._sign and Verifier._verify on SIGNING_STRING."""
+    def keys():
+        private, public = _secrets(algorithm, bits)
+        signer = Signer(private, algorithm)
+        return signer, Verifier(public, algorithm), signer._sign(SIGNING_STRING)
+
+    def sign():
+        signer = keys()[0]
+        return lambda: signer._sign(SIGNING_STRING)
+
+    def verify():
+        _, verifier, signature = keys()
+        return lambda: verifier._verify(SIGNING_STRING, signature)
+
+    return sign, verify
+
+
+def _supported(algorithm):
+    """Whether the default backend can load keys for algorithm."""
+    scheme = get_algorithm(algorithm)[0]
+    return scheme == 'hmac' or hasattr(get_backend(), 'load_%s_key' % scheme.replace('-', '_'))
+
+
+def suite_algorithms():
+    """Signer._sign and Verifier._verify on the same signing string, for every algorithm of the default backend."""
+    for algorithm in sorted(ALGORITHMS):
+        if not _supported(algorithm):
+            continue
+        sign, verify = _sign_verify(algorithm)
+        yield ('sign %s' % algorithm, sign)
+        yield ('verify %s' % algorithm, verify)
+
+
+def suite_rsa_key_sizes():
+    """rsa-sha256 signing and verification for each key size."""
+    for bits in RSA_KEY_SIZES:
+        sign, verify = _sign_verify('rsa-sha256', bits)
+        yield ('sign rsa-sha256 %d' % bits, sign)
+        yield ('verify rsa-sha256 %d' % bits, verify)
+
+
+def suite_rsa_blinding():
+    """
+    rsa-sha256 2048 signing with each blinding strategy of the pycrypto backend, against
+    pycrypto's own PKCS1_v1_5 signer (which draws a random blinding factor per signature)
+    and the cryptography backend.
+    """
+    def baseline():
+        from Crypto.Hash import SHA256
+        from Crypto.PublicKey import RSA
+        from Crypto.Signature import PKCS1_v1_5
+        signer = PKCS1_v1_5.new(RSA.importKey(_rsa_keypair(2048)[0]))
+        return lambda: signer.sign(SHA256.new(SIGNING_STRING))
+
+    def case(backend, blinding=None):
+        signer = Signer(_rsa_keypair(2048)[0], 'rsa-sha256', backend=backend, blinding=blinding)
+        return lambda: signer._sign(SIGNING_STRING)
+
+    backends = available_backends()
+    if 'pycrypto' in backends:
+        yield ('sign rsa-sha256 2048 pycrypto PKCS1_v1_5', baseline)
+        for blinding in BLINDINGS:
+            yield ('sign rsa-sha256 2048 pycrypto %s blinding' % blinding,
+                   lambda blinding=blinding: case('pycrypto', blinding))
+    if 'cryptography' in backends:
+        yield ('sign rsa-sha256 2048 cryptography', lambda: case('cryptography'))
+
+
+def _header_cases(count):
+    """Case factories for requests covering count headers."""
+    headers = {'Date': 'Thu, 05 Jan 2012 21:31:40 GMT'}
+    headers.update(('X-Header-%d' % i, 'value %d' % i) for i in range(count - 1))
+    names = sorted(h.lower() for h in headers)
+    hs = HeaderSigner(key_id='bench', secret=HMAC_SECRET, algorithm='hmac-sha256', headers=names)
+    signed = dict(headers, Authorization=hs.authorization(headers))
+
+    def engine():
+        engine = SignatureVerifier(KeyStore({'bench': HMAC_SECRET}), required_headers=names)
+        return lambda: engine.verify(signed)
+
+    return (lambda: lambda: hs.sign(headers),
+            lambda: lambda: HeaderVerifier(signed, HMAC_SECRET, required_headers=names).verify(),
+            engine)
+
+
+def suite_header_counts():
+    """Whole requests signing and covering n headers, with hmac-sha256 so the headers dominate."""
+    for count in HEADER_COUNTS:
+        sign, header_verifier, engine = _header_cases(count)
+        yield ('HeaderSigner.sign %d headers' % count, sign)
+        yield ('HeaderVerifier %d headers' % count, header_verifier)
+        yield ('SignatureVerifier %d headers' % count, engine)
+
+
+def suite_keystore():
+    """Whole verifications through SignatureVerifier with the key preloaded in its KeyStore."""
+    def case(algorithm):
+        private, public = _secrets(algorithm)
+        hs = HeaderSigner(key_id='bench', secret=private, algorithm=algorithm, headers=['date'])
+        headers = {'Date': 'Thu, 05 Jan 2012 21:31:40 GMT'}
+        signed = dict(headers, Authorization=hs.authorization(headers))
+        keystore = KeyStore({'bench': (public, algorithm)})
+        keystore.preload()
+        engine = SignatureVerifier(keystore)
+        return lambda: engine.verify(signed)
+
+    for algorithm in ('hmac-sha256', 'rsa-sha256', 'ecdsa-sha256', 'ed25519'):
+        if _supported(algorithm):
+            yield ('KeyStore verify %s' % algorithm, lambda algorithm=algorithm: case(algorithm))
+
+
+def suite_requests_auth():
+    """HTTPSignatureAuth on a prepared request, as called by requests."""
+    try:
+        import requests
+        from .requests_auth import HTTPSignatureAuth
+    except ImportError:
+        return
+
+    def case(algorithm):
+        auth = HTTPSignatureAuth(key_id='bench', secret=_secrets(algorithm)[0], algorithm=algorithm,
+                                 headers=['(request-line)', 'host', 'date'])
+        r = requests.Request('GET', 'https://example.com/resource?id=1',
+                             headers={'Date': 'Thu, 05 Jan 2012 21:31:40 GMT'}).prepare()
+        return lambda: auth(r)
+
+    for algorithm in ('hmac-sha256', 'rsa-sha256', 'ed25519'):
+        if _supported(algorithm):
+            yield ('HTTPSignatureAuth %s' % algorithm, lambda algorithm=algorithm: case(algorithm))
+
+
+# each suite yields (name, setup) pairs, setup() returning the operation to time
+SUITE = [suite_algorithms, suite_rsa_key_sizes, suite_rsa_blinding, suite_header_counts, suite_keystore,
+         suite_requests_auth]
+
+
+def run_suite(pattern=None, min_time=0.2):
+    """Run the suite (cases whose name contains pattern, if given) and return the result records."""
+    results = []
+    for group in SUITE:
+        for name, setup in group():
+            if pattern and pattern not in name:
+                continue
+            results.append(measure(name, group.__name__[len('suite_'):], setup(), min_time=min_time))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m httpsig.bench', description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    parser.add_argument('-k', dest='pattern', help='only run cases whose name contains PATTERN')
+    parser.add_argument('--min-time', type=float, default=0.2, help='seconds spent on each case (default 0.2)')
+    parser.add_argument('--compare', action='store_true',
+                        help='run the micro-benchmarks comparing former and current implementations')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        for bench in BENCHMARKS:
+            for label, usec in bench():
+                print('%-45s %10.2f us/op' % (label, usec))
+        return
+
+    results = run_suite(args.pattern, args.min_time)
+    if args.json:
+        from . import __version__
+        json.dump({
+            'version': __version__,
+            'python': sys.version.split()[0],
+            'backend': get_backend().name,
+            'results': results,
+        }, sys.stdout, indent=2, sort_keys=True)
+        print('')
+        return
+    for r in results:
+        print('%-50s %12.0f ops/s %10.2f us p50 %10.2f us p99 %8.1f gc objects' % (
+            r['name'], r['ops_per_sec'], r['p50_us'], r['p99_us'], r['gc_objects_per_op']))
+
+
+if __name__ == '__main__':
+    main()
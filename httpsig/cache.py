@@ -0,0 +1,90 @@
+"""
+Cache of successful verifications, for retried and replayed requests.
+"""
+import time
+import hashlib
+import threading
+
+from .utils import LRUCache, parse_http_date
+
+
+class VerificationCache(object):
+    """
+    Remembers successful verifications so that byte-identical requests skip the signature check.
+
+    Entries are keyed by a hash of (keyId, algorithm, signing string, signature) and only
+    positive results are stored. An entry lives until max_age seconds after the Date header
+    of the request, and never longer than max_age, even for a Date in the future; requests
+    without a usable Date header are never cached. Entries for a key
+    are dropped whenever keystore replaces, removes or invalidates it.
+
+    maxsize bounds the number of entries.
+    hits and misses count lookups, to measure the savings.
+    """
+    def __init__(self, keystore, maxsize=10000, max_age=300, clock=time.time):
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = LRUCache(maxsize=maxsize, clock=clock)
+        # bumped by clear(), so that verifications it overlapped are not cached
+        self._generation = 0
+        self._key_generations = {}
+        keystore.add_listener(self.clear)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _generation_of(self, key_id):
+        return self._generation, self._key_generations.get(key_id, 0)
+
+    def _key(self, params, signable):
+        h = hashlib.sha256()
+        for part in (params.key_id, params.algorithm, signable, params.signature):
+            h.update(part or '')
+            h.update('\0')
+        return h.digest()
+
+    def check(self, params, signable, date, verify):
+        """
+        Return True for a cached success, otherwise verify(params, signable),
+        caching the result if it is a success and the key was not rotated meanwhile.
+
+        params is the SignatureParams of the request, signable its signing string and
+        date the value of its Date header (or None).
+        """
+        key = self._key(params, signable)
+        hit = self._entries.get(key) is not None
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            generation = self._generation_of(params.key_id)
+        if hit:
+            return True
+
+        result = verify(params, signable)
+        if result:
+            timestamp = parse_http_date(date)
+            if timestamp is not None:
+                ttl = min(timestamp + self.max_age - self._clock(), self.max_age)
+                with self._lock:
+                    if ttl > 0 and self._generation_of(params.key_id) == generation:
+                        self._entries.set(key, params.key_id, ttl=ttl)
+        return result
+
+    def clear(self, key_id=None):
+        """Drop the entries for key_id, or every entry if key_id is None."""
+        with self._lock:
+            if key_id is None:
+                self._generation += 1
+            else:
+                self._key_generations[key_id] = self._key_generations.get(key_id, 0) + 1
+        if key_id is None:
+            self._entries.clear()
+            return
+        for key in self._entries.keys():
+            if self._entries.get(key) == key_id:
+                self._entries.discard(key)
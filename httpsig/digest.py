@@ -0,0 +1,188 @@
+"""
+Digest header (RFC 3230) computation and validation for request bodies, one chunk at a time.
+"""
+import os
+import mmap
+import base64
+import hashlib
+import tempfile
+
+from .utils import HttpSigException
+
+DIGEST_ALGORITHMS = {
+    'SHA-256': hashlib.sha256,
+    'SHA-512': hashlib.sha512,
+}
+
+CHUNK_SIZE = 64 * 1024
+
+# iterable bodies are spooled to disk past this many bytes
+SPOOL_SIZE = 1024 * 1024
+
+
+def _header_value(algorithm, h):
+    return '%s=%s' % (algorithm, base64.b64encode(h.digest()))
+
+
+def _new_hash(algorithm):
+    try:
+        return DIGEST_ALGORITHMS[algorithm]()
+    except KeyError:
+        raise HttpSigException("Unsupported digest algorithm.")
+
+
+class SpooledBody(object):
+    """
+    A one-shot iterable body that has been hashed and spooled to a temporary file
+    (in memory up to SPOOL_SIZE), so that it can be sent after its Digest header.
+
+    Iterating it yields chunk_size chunks; len() is its size in bytes.
+    """
+    def __init__(self, chunks, h, chunk_size=CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self._file = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+        self._length = 0
+        for chunk in chunks:
+            h.update(chunk)
+            self._file.write(chunk)
+            self._length += len(chunk)
+        self._file.seek(0)
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        self._file.seek(0)
+        return iter(lambda: self._file.read(self.chunk_size), b'')
+
+    def read(self, size=-1):
+        return self._file.read(size)
+
+    def close(self):
+        self._file.close()
+
+
+def _mmap_update(h, fd, start=0):
+    """Hash the file behind fd from offset start to its end through mmap; return False if it cannot be mapped."""
+    try:
+        mm = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+    except (EnvironmentError, ValueError, OverflowError):
+        # pipes, sockets, empty files...
+        return False
+    try:
+        h.update(buffer(mm, start) if start else mm)
+    finally:
+        mm.close()
+    return True
+
+
+def digest_file(file, algorithm='SHA-256', chunk_size=CHUNK_SIZE):
+    """
+    Compute the Digest header value of a file on disk, for signing uploads of that file.
+
+    file is a path or an OS-level file descriptor; a descriptor is left open and hashed from
+    its current position, like digest_body does, which is restored afterwards. The file is
+    hashed straight from an mmap of it, without copying it through Python buffers. Files that
+    cannot be mapped (pipes, empty files) are read in chunks instead; pipes are consumed.
+    """
+    h = _new_hash(algorithm)
+    if isinstance(file, (int, long)):
+        fd = file
+    else:
+        fd = os.open(file, os.O_RDONLY)
+    try:
+        try:
+            start = os.lseek(fd, 0, os.SEEK_CUR)
+        except OSError:
+            # pipes and sockets have no position, and cannot be mapped either
+            start = None
+        if start is None or not _mmap_update(h, fd, start):
+            for chunk in iter(lambda: os.read(fd, chunk_size), b''):
+                h.update(chunk)
+            if start is not None:
+                os.lseek(fd, start, os.SEEK_SET)
+    finally:
+        if fd is not file:
+            os.close(fd)
+    return _header_value(algorithm, h)
+
+
+def digest_body(body, algorithm='SHA-256', chunk_size=CHUNK_SIZE):
+    """
+    Compute the Digest header value of a request body without loading it in memory.
+
+    body is None, a byte string, a file object or an iterable of byte string chunks. Unicode
+    bodies, which requests sends as they are, must be ASCII; they are replaced by their bytes.
+    Files on disk are hashed through mmap from their current position, other seekable
+    files chunk by chunk and rewound to where they started. Other iterables can only be
+    read once, so they are spooled to a SpooledBody while hashed.
+
+    Returns (body, digest): the body to send (the same object unless it was spooled)
+    and the value for the Digest header.
+    """
+    h = _new_hash(algorithm)
+    if isinstance(body, unicode):
+        try:
+            body = body.encode('ascii')
+        except UnicodeEncodeError:
+            raise HttpSigException("Unicode bodies must be encoded to bytes before signing.")
+    if body is None or isinstance(body, (bytes, bytearray)):
+        h.update(body or b'')
+    elif hasattr(body, 'read') and hasattr(body, 'seek'):
+        start = body.tell()
+        try:
+            fd = body.fileno()
+            # make pending writes visible to the mapping
+            body.flush()
+        except (AttributeError, EnvironmentError, ValueError):
+            fd = None
+        if fd is None or not _mmap_update(h, fd, start):
+            for chunk in iter(lambda: body.read(chunk_size), b''):
+                h.update(chunk)
+            body.seek(start)
+    else:
+        chunks = body
+        if hasattr(body, 'read'):
+            chunks = iter(lambda: body.read(chunk_size), b'')
+        body = SpooledBody(chunks, h, chunk_size)
+    return body, _header_value(algorithm, h)
+
+
+class DigestValidator(object):
+    """
+    Checks a request body against its Digest header as the body is read.
+
+    digest is the Digest header value; the first supported algorithm in it is used.
+    Feed the body to update() and call valid() at the end, or use validate() to wrap the stream.
+    """
+    def __init__(self, digest):
+        for instance in digest.split(','):
+            algorithm, _, value = instance.strip().partition('=')
+            for name in DIGEST_ALGORITHMS:
+                if name.lower() == algorithm.lower():
+                    self.algorithm = name
+                    self.expected = value
+                    self._hash = _new_hash(name)
+                    return
+        raise HttpSigException("Unsupported digest algorithm.")
+
+    def update(self, chunk):
+        self._hash.update(chunk)
+
+    def valid(self):
+        """Return whether the data fed so far matches the Digest header."""
+        return base64.b64encode(self._hash.digest()) == self.expected
+
+    def validate(self, stream, chunk_size=CHUNK_SIZE):
+        """
+        Yield the chunks of stream (a file object or an iterable of chunks) while hashing them,
+        raising HttpSigException once the end is reached if the body does not match.
+        """
+        chunks = stream
+        if hasattr(stream, 'read'):
+            chunks = iter(lambda: stream.read(chunk_size), b'')
+        for chunk in chunks:
+            self.update(chunk)
+            yield chunk
+        if not self.valid():
+            raise HttpSigException("Body does not match the Digest header.")
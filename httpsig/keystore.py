@@ -0,0 +1,171 @@
+"""
+Registry of verification keys, indexed by the keyId sent in the Authorization header.
+"""
+import time
+import threading
+
+from .prevalidation import RequestRejected
+from .verify import Verifier
+from .utils import LRUCache, ALGORITHMS, get_algorithm
+
+
+def _is_asymmetric(secret):
+    """Whether secret is a PEM or OpenSSH key, which must never be used as an HMAC secret."""
+    return secret.lstrip().startswith(('-----BEGIN ', 'ssh-'))
+
+
+class KeyStore(object):
+    """
+    Holds the secrets known to a server and a parsed Verifier for each of them,
+    so that key import happens once per key instead of once per request. The Verifiers
+    keep keys in the backend's loaded form (e.g. decoded ECDSA points), so verifying a
+    request with a parsed key costs one signature check; see preload() to parse keys
+    ahead of the first request.
+
+    keys is an optional mapping of keyId to secret, or of keyId to (secret, algorithm)
+    to pin a key to a single algorithm. Keys that are not pinned are restricted to the
+    algorithms their secret fits: PEM and OpenSSH keys to RSA, ECDSA and Ed25519, other
+    secrets to HMAC, so that a public key cannot be used as an HMAC secret.
+    loader is an optional callable returning the secret (or a (secret, algorithm) tuple)
+    for a keyId that was not registered, or None if the keyId is unknown.
+    loader_ttl is the number of seconds the results of loader, unknown keyIds included,
+    are remembered (and keys parsed from them used), so that it is not called on every
+    request while revoked keys still expire. Unknown keyIds are kept
+    apart from the secrets loaded, so that a flood of them cannot evict known keys.
+    maxsize bounds the number of keyIds with parsed keys kept in memory, and that of
+    loader results (secrets and unknown keyIds each).
+    ttl is the number of seconds a parsed key is used before it is rebuilt from its secret.
+    backend is the crypto backend to parse keys with, as for Signer.
+    clock is the time source of the ttls, overridable for tests.
+    """
+    def __init__(self, keys=None, loader=None, maxsize=128, ttl=None, backend=None, loader_ttl=60,
+                 clock=time.time):
+        self.backend = backend
+        self._secrets = {}
+        self._loader = loader
+        self.loader_ttl = loader_ttl
+        self._loaded = LRUCache(maxsize=maxsize, ttl=loader_ttl, clock=clock)
+        self._unknown = LRUCache(maxsize=maxsize, ttl=loader_ttl, clock=clock)
+        self._listeners = []
+        self._lock = threading.Lock()
+        # keyId -> {algorithm: Verifier}
+        self._cache = LRUCache(maxsize=maxsize, ttl=ttl, clock=clock)
+        for key_id, secret in (keys or {}).items():
+            if isinstance(secret, tuple):
+                self.add(key_id, *secret)
+            else:
+                self.add(key_id, secret)
+
+    def __contains__(self, key_id):
+        return key_id in self._cache or self._lookup(key_id)[0] is not None
+
+    def add(self, key_id, secret, algorithm=None):
+        """
+        Register (or replace) the secret for key_id.
+        For RSA, ECDSA and Ed25519 the secret is the PUBLIC key, for HMAC the shared secret.
+        """
+        assert algorithm is None or algorithm in ALGORITHMS, "Unknown algorithm"
+        with self._lock:
+            self._secrets[key_id] = (secret, algorithm)
+        self.invalidate(key_id)
+
+    def remove(self, key_id):
+        """Forget key_id and drop any parsed key held for it."""
+        with self._lock:
+            self._secrets.pop(key_id, None)
+        self.invalidate(key_id)
+
+    def invalidate(self, key_id=None):
+        """
+        Drop the parsed keys for key_id (or for every key if None), e.g. after a rotation.
+        The secrets stay registered and are parsed again on next use; secrets returned by
+        the loader are forgotten and loaded again.
+        """
+        if key_id is None:
+            self._cache.clear()
+            self._loaded.clear()
+            self._unknown.clear()
+        else:
+            self._cache.discard(key_id)
+            self._loaded.discard(key_id)
+            self._unknown.discard(key_id)
+        for listener in self._listeners:
+            listener(key_id)
+
+    def add_listener(self, callback):
+        """
+        Call callback(key_id) whenever a key is replaced, removed or invalidated
+        (key_id is None when every key is).
+        """
+        self._listeners.append(callback)
+
+    def preload(self, key_ids=None):
+        """
+        Parse the keys of key_ids (defaulting to every registered key) now rather than
+        on their first request. Only keys pinned to an algorithm can be parsed ahead;
+        return the number of keys parsed. Keys beyond maxsize are evicted again.
+        """
+        with self._lock:
+            entries = [(key_id, self._secrets.get(key_id)) for key_id in key_ids or list(self._secrets)]
+        parsed = 0
+        for key_id, entry in entries:
+            if entry is not None and entry[1] is not None:
+                self.get_verifier(key_id, entry[1])
+                parsed += 1
+        return parsed
+
+    def _lookup(self, key_id):
+        """
+        Return ((secret, algorithm), ttl) for key_id, or (None, None) if it is unknown;
+        ttl is the lifetime of the keys parsed from it, None for registered secrets.
+        """
+        with self._lock:
+            entry = self._secrets.get(key_id)
+        if entry is not None:
+            return entry, self._cache.ttl
+        entry = self._loaded.get(key_id)
+        if entry is None and self._loader is not None and key_id not in self._unknown:
+            entry = self._loader(key_id)
+            self._remember(key_id, entry)
+            if entry is not None and not isinstance(entry, tuple):
+                entry = (entry, None)
+        if entry is None:
+            return None, None
+        if self._cache.ttl is None or self.loader_ttl is None:
+            return entry, self._cache.ttl or self.loader_ttl
+        return entry, min(self._cache.ttl, self.loader_ttl)
+
+    def _remember(self, key_id, entry):
+        """
+        Keep entry, a secret or a (secret, algorithm) tuple returned for key_id by a loader
+        (or None if key_id is unknown), for loader_ttl seconds.
+        """
+        if entry is None:
+            self._unknown.set(key_id, True)
+        else:
+            if not isinstance(entry, tuple):
+                entry = (entry, None)
+            self._loaded.set(key_id, entry)
+
+    def get_verifier(self, key_id, algorithm):
+        """
+        Return a ready-to-use Verifier for key_id and algorithm, parsing the key on first use.
+        Raises RequestRejected if key_id is unknown or pinned to another algorithm.
+        """
+        verifiers = self._cache.get(key_id)
+        verifier = verifiers and verifiers.get(algorithm)
+        if verifier is None:
+            entry, ttl = self._lookup(key_id)
+            if entry is None:
+                raise RequestRejected('key_id', "Unknown key id.")
+            secret, pinned = entry
+            if pinned is not None and pinned != algorithm:
+                raise RequestRejected('algorithm', "Algorithm not allowed for this key.")
+            if pinned is None and (get_algorithm(algorithm)[0] == 'hmac') == _is_asymmetric(secret):
+                raise RequestRejected('algorithm', "Algorithm not allowed for this key.")
+            verifier = Verifier(secret, algorithm=algorithm, backend=self.backend)
+            if verifiers is None:
+                self._cache.set(key_id, {algorithm: verifier}, ttl=ttl)
+            else:
+                verifiers[algorithm] = verifier
+        return verifier
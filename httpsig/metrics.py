@@ -0,0 +1,116 @@
+"""
+Instrumentation of the signing and verification hot paths.
+
+Register a Metrics object with set_metrics() to receive the duration of each stage and
+the outcome of each signature and verification. With none registered (the default) the
+hot paths only pay for a None check.
+
+Stages:
+'parse'           parsing (and pre-validation) of the Authorization header
+'signing_string'  building the signing string from the headers
+'key_lookup'      finding the key of a request, parsing it if needed
+'hash'            computing the HMAC of the signing string
+'rsa'             the RSA signature or verification (PKCS#1 v1.5 or PSS)
+'ecdsa'           the ECDSA signature or verification
+'ed25519'         the Ed25519 signature or verification
+"""
+import timeit
+
+from .utils import ALGORITHMS
+
+STAGES = ('parse', 'signing_string', 'key_lookup', 'hash', 'rsa', 'ecdsa', 'ed25519')
+
+timer = timeit.default_timer
+
+# the registered Metrics, read by the instrumented code on each call
+current = None
+
+
+class Metrics(object):
+    """
+    Receiver of measurements; every method does nothing, override the ones needed.
+    Methods are called from any thread and must be thread-safe.
+    """
+    def observe(self, stage, algorithm, seconds):
+        """A stage (see STAGES) took seconds for a request using algorithm (None when not known yet)."""
+
+    def signed(self, algorithm):
+        """A signature was made with algorithm."""
+
+    def verified(self, algorithm, reason=None):
+        """
+        A verification ended: successfully if reason is None, otherwise failed for reason,
+        'bad_signature' or the stage of the RequestRejected raised (e.g. 'key_id', 'replay').
+        algorithm is None when the Authorization header could not be parsed, and 'other'
+        when it names an unknown algorithm (see algorithm_label).
+        """
+
+
+def set_metrics(metrics):
+    """Register metrics to receive the measurements of every signer and verifier; None disables them."""
+    global current
+    current = metrics
+
+
+def get_metrics():
+    """Return the registered Metrics, or None."""
+    return current
+
+
+def measured(metrics, stage, algorithm, fn):
+    """Wrap fn so that each call reports its duration to metrics as stage."""
+    def wrapper(*args):
+        start = timer()
+        result = fn(*args)
+        metrics.observe(stage, algorithm, timer() - start)
+        return result
+    return wrapper
+
+
+def algorithm_label(algorithm):
+    """
+    The algorithm reported for a request, which comes from its unauthenticated Authorization
+    header: unknown algorithms are all reported as 'other', so that they cannot create an
+    unbounded number of label values.
+    """
+    if algorithm is None or algorithm in ALGORITHMS:
+        return algorithm
+    return 'other'
+
+
+def failure_reason(exception):
+    """The reason reported for a verification that raised exception."""
+    return getattr(exception, 'stage', None) or 'error'
+
+
+class PrometheusMetrics(Metrics):
+    """
+    Metrics exported through prometheus_client:
+
+    <namespace>_stage_seconds           histogram of stage durations, by stage and algorithm
+    <namespace>_signatures_total        counter of signatures, by algorithm
+    <namespace>_verifications_total     counter of verifications, by algorithm, result and reason
+
+    registry defaults to the prometheus_client default registry.
+    buckets are the histogram buckets, in seconds.
+    """
+    def __init__(self, registry=None, namespace='httpsig',
+                 buckets=(1e-6, 5e-6, 1e-5, 5e-5, 1e-4, 5e-4, 1e-3, 5e-3, 1e-2, 5e-2)):
+        from prometheus_client import Counter, Histogram, REGISTRY
+        if registry is None:
+            registry = REGISTRY
+        self._stages = Histogram('stage_seconds', 'Time spent in each signing or verification stage.',
+                                 ['stage', 'algorithm'], namespace=namespace, registry=registry, buckets=buckets)
+        self._signatures = Counter('signatures_total', 'Signatures made.',
+                                   ['algorithm'], namespace=namespace, registry=registry)
+        self._verifications = Counter('verifications_total', 'Verifications, by result and failure reason.',
+                                      ['algorithm', 'result', 'reason'], namespace=namespace, registry=registry)
+
+    def observe(self, stage, algorithm, seconds):
+        self._stages.labels(stage, algorithm or '').observe(seconds)
+
+    def signed(self, algorithm):
+        self._signatures.labels(algorithm).inc()
+
+    def verified(self, algorithm, reason=None):
+        self._verifications.labels(algorithm or '', 'success' if reason is None else 'failure', reason or '').inc()
@@ -0,0 +1,108 @@
+"""
+Cheap checks run on a request before any key is imported or any hash computed.
+"""
+from .utils import parse_signature_params, find_header, SigningStringTemplate, HeaderView, _HEADER, _HOST, \
+    ALGORITHMS, HttpSigException
+
+
+class RequestRejected(HttpSigException):
+    """
+    Raised when a request is turned away for a known reason, named by stage: one of
+    PreValidator.STAGES, or 'replay' for a reused signature (see ReplayGuard).
+    """
+    def __init__(self, stage, message):
+        super(RequestRejected, self).__init__(message)
+        self.stage = stage
+
+    def __reduce__(self):
+        # keep it picklable, e.g. for the results of verify_many
+        return (RequestRejected, (self.stage, self.message))
+
+
+class PreValidator(object):
+    """
+    Ordered pipeline of cheap validators, run before any cryptography so that
+    bad requests are rejected in microseconds:
+
+    'syntax'      the Authorization header is present, well formed and has keyId, algorithm and signature
+    'algorithm'   the algorithm is in the allow-list
+    'key_id'      the keyId is known to keystore (skipped without a keystore)
+    'headers'     the signature covers required_headers and the request has every signed header
+    'clock_skew'  the request time is within the window of replay_guard (skipped without one)
+
+    keystore, required_headers (defaulting to ['date']) and algorithms (defaulting to all of
+    them) are as for SignatureVerifier; replay_guard is a ReplayGuard, only used here for its
+    freshness check.
+    """
+    STAGES = ('syntax', 'algorithm', 'key_id', 'headers', 'clock_skew')
+
+    def __init__(self, keystore=None, required_headers=None, algorithms=None, replay_guard=None):
+        self.keystore = keystore
+        self.required_headers = frozenset(h.lower() for h in required_headers or ['date'])
+        self.algorithms = frozenset(algorithms or ALGORITHMS)
+        assert self.algorithms <= ALGORITHMS, "Unknown algorithm"
+        self.replay_guard = replay_guard
+
+    def check(self, headers, host=None, check_key=True):
+        """
+        Run every stage on a request, in order, and return its SignatureParams.
+
+        headers is a dict, HeaderView or list of (name, value) pairs holding the request headers.
+        host is the host override given for verification, if any ('host' then need not be a header).
+        check_key=False skips the 'key_id' stage, for callers that fetch unknown keys themselves.
+
+        Raises RequestRejected, naming the stage that failed.
+        """
+        headers = HeaderView(headers)
+        params, template = self._check_params(headers, check_key)
+        # the compiled template has the spellings to try for each header, see find_header
+        for kind, _, name, spellings in template.steps:
+            if kind is _HEADER or (kind is _HOST and not host):
+                try:
+                    find_header(headers, name, spellings)
+                except KeyError:
+                    raise RequestRejected('headers', 'missing required header "%s"' % name)
+        self._check_fresh(params, headers)
+        return params
+
+    def _check_params(self, headers, check_key):
+        """
+        The stages up to the signed header list ('syntax', 'algorithm', 'key_id' and the
+        required headers): return the SignatureParams and the SigningStringTemplate of a
+        request whose headers is a HeaderView.
+        """
+        try:
+            params = parse_signature_params(headers['authorization'])
+        except KeyError:
+            raise RequestRejected('syntax', "Missing Authorization header.")
+        except HttpSigException as e:
+            raise RequestRejected('syntax', e.message)
+        if not (params.key_id and params.algorithm and params.signature):
+            raise RequestRejected('syntax', "Malformed Authorization header.")
+
+        if params.algorithm not in self.algorithms:
+            raise RequestRejected('algorithm', "Algorithm not allowed.")
+
+        if check_key and self.keystore is not None and params.key_id not in self.keystore:
+            raise RequestRejected('key_id', "Unknown key id.")
+
+        signed = params.headers or ('date',)
+        missing = self.required_headers.difference(signed)
+        if missing:
+            raise RequestRejected('headers', '{} is a required header(s)'.format(', '.join(sorted(missing))))
+        return params, SigningStringTemplate.compile(signed)
+
+    def _render(self, template, headers, host, method, path):
+        """
+        The rest of the 'headers' stage for callers that need the signing string anyway:
+        render it, so that each header is looked up once, rejecting requests missing one.
+        """
+        try:
+            return template.render(headers, host, method, path)
+        except Exception as e:
+            raise RequestRejected('headers', str(e))
+
+    def _check_fresh(self, params, headers):
+        if self.replay_guard is not None:
+            # raises RequestRejected('clock_skew', ...)
+            self.replay_guard.check_fresh(params, headers)
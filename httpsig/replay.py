@@ -0,0 +1,122 @@
+"""
+Replay protection: freshness window on the request date and single use of each signature.
+"""
+import time
+import hashlib
+import threading
+
+from .prevalidation import RequestRejected
+from .utils import parse_http_date
+
+
+class LocalReplayStore(object):
+    """
+    In-process replay store.
+
+    Keys are kept in buckets covering bucket_seconds of expiry time each, so a lookup
+    touches a single set and expired keys are dropped a whole bucket at a time.
+    max_entries bounds memory: when it is reached the oldest bucket is dropped early,
+    and keys expiring before the dropped bucket are refused from then on.
+
+    Any object with the same add(key, expires) method can be used instead, e.g. one backed
+    by a store shared between servers (SET key NX with an expiry).
+    """
+    def __init__(self, bucket_seconds=10, max_entries=1000000, clock=time.time):
+        self.bucket_seconds = bucket_seconds
+        self.max_entries = max_entries
+        self._clock = clock
+        self._buckets = {}
+        self._oldest = None
+        self._floor = 0
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    def _drop(self, bucket):
+        keys = self._buckets.pop(bucket, None)
+        if keys:
+            self._size -= len(keys)
+
+    def _expire(self, now):
+        # drop every bucket whose whole range has expired, one bucket id at a time
+        current = int(now // self.bucket_seconds)
+        if self._oldest is None:
+            self._oldest = current
+        elif not self._buckets:
+            # nothing to drop, skip straight to the current bucket
+            self._oldest = max(self._oldest, current)
+        while self._oldest < current:
+            self._drop(self._oldest)
+            self._oldest += 1
+
+    def add(self, key, expires):
+        """
+        Record key until expires (a Unix timestamp).
+        Returns False if key was already recorded (or can no longer be tracked), True otherwise.
+        """
+        bucket = int(expires // self.bucket_seconds)
+        with self._lock:
+            self._expire(self._clock())
+            if bucket < self._oldest or expires < self._floor:
+                return False
+            keys = self._buckets.get(bucket)
+            if keys is None:
+                keys = self._buckets[bucket] = set()
+            elif key in keys:
+                return False
+            keys.add(key)
+            self._size += 1
+
+            while self._size > self.max_entries:
+                while self._oldest not in self._buckets:
+                    self._oldest += 1
+                self._floor = (self._oldest + 1) * self.bucket_seconds
+                self._drop(self._oldest)
+                self._oldest += 1
+            return True
+
+
+class ReplayGuard(object):
+    """
+    Rejects requests that are stale or whose signature was already used.
+
+    The request time is the Date header, which the signature must cover: requests whose
+    signature does not cover it are rejected as stale. The 'created' parameter is ignored, as
+    signing strings cannot cover '(created)' and an attacker could otherwise refresh a captured
+    request by appending it.
+    max_skew is the number of seconds that time may differ from the local clock.
+    store records used signatures until they fall out of the window; it defaults to a LocalReplayStore.
+    """
+    def __init__(self, max_skew=300, store=None, clock=time.time):
+        self.max_skew = max_skew
+        self.store = store if store is not None else LocalReplayStore(clock=clock)
+        self._clock = clock
+
+    def request_time(self, params, headers):
+        """Return the creation time of a request as a Unix timestamp, or None if the signature does not cover it."""
+        if 'date' not in (params.headers or ('date',)):
+            return None
+        return parse_http_date(headers.get('date'))
+
+    def check_fresh(self, params, headers):
+        """Raise RequestRejected (stage 'clock_skew') unless the request time is within max_skew of now."""
+        timestamp = self.request_time(params, headers)
+        if timestamp is None:
+            raise RequestRejected('clock_skew', "Missing or invalid request date.")
+        if abs(self._clock() - timestamp) > self.max_skew:
+            raise RequestRejected('clock_skew', "Request date outside the allowed clock skew.")
+        return timestamp
+
+    def mark_used(self, params, timestamp):
+        """
+        Record the signature of a verified request, raising RequestRejected (stage 'replay')
+        if it was already used.
+        timestamp is the request time returned by check_fresh.
+        """
+        h = hashlib.sha256(params.key_id or '')
+        h.update('\0')
+        h.update(params.signature or '')
+        if not self.store.add(h.digest()[:16], timestamp + self.max_skew):
+            raise RequestRejected('replay', "Replayed signature.")
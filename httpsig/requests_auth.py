@@ -1,7 +1,14 @@
+import threading
+
+from requests import Session
+from requests.adapters import HTTPAdapter, DEFAULT_POOLSIZE
 from requests.auth import AuthBase
 from urlparse import urlparse
 
+from . import metrics as _metrics
 from .sign import HeaderSigner
+from .digest import digest_body
+from .utils import LRUCache, HttpSigException
 
 
 class HTTPSignatureAuth(AuthBase):
@@ -11,23 +18,102 @@ class HTTPSignatureAuth(AuthBase):
 
     key_id is the mandatory label indicating to the server which secret to use
     secret is the filename of a pem file in the case of rsa, a password string in the case of an hmac algorithm
-    algorithm is one of the six specified algorithms
+    algorithm is one of the algorithms of httpsig.utils.ALGORITHMS
     headers is a list of http headers to be included in the signing string, defaulting to "Date" alone.
+    digest_algorithm is the algorithm of the Digest header added to requests when "Digest" is signed.
     '''
     def __init__(self, key_id='', secret='', algorithm='hmac-sha256',
-            headers=None, allow_agent=False):
+            headers=None, allow_agent=False, digest_algorithm='SHA-256'):
         headers = headers or []
         self.header_signer = HeaderSigner(key_id=key_id, secret=secret,
                 algorithm=algorithm, headers=headers)
         self.uses_host = 'host' in [h.lower() for h in headers]
+        self.uses_digest = 'digest' in [h.lower() for h in headers]
+        self.digest_algorithm = digest_algorithm
+        # (netloc, signing string template) of each base URL ('scheme://netloc') seen,
+        # so urlparse runs and the 'host' line is rendered once per host
+        self._hosts = LRUCache(maxsize=256)
+
+    def _split_url(self, url):
+        """
+        Return (netloc, template, path) for a prepared URL: the template is the signing string
+        template for its host, the path includes the query string as in path_url.
+        """
+        end = url.find('/', url.find('//') + 2)
+        if end == -1:
+            base, path = url, '/'
+        else:
+            base, path = url[:end], url[end:].partition('#')[0]
+        entry = self._hosts.get(base)
+        if entry is None:
+            netloc = urlparse(base).netloc
+            template = self.header_signer.template
+            if self.uses_host:
+                template = template.with_host(netloc)
+            entry = (netloc, template)
+            self._hosts.set(base, entry)
+        return entry + (path,)
 
     def __call__(self, r):
-        headers = self.header_signer.sign(
-                r.headers,
-                # 'Host' header unavailable in request object at this point
-                # if 'host' header is needed, extract it from the url
-                host=urlparse(r.url).netloc if self.uses_host else None,
-                method=r.method,
-                path=r.path_url)
-        r.headers.update(headers)
+        if self.uses_digest and 'digest' not in r.headers:
+            # hashed chunk by chunk; one-shot iterables are spooled, not buffered in memory
+            r.body, r.headers['Digest'] = digest_body(r.body, self.digest_algorithm)
+        # 'Host' header unavailable in request object at this point
+        # if 'host' header is needed, extract it from the url
+        netloc, template, path = self._split_url(r.url)
+        signer = self.header_signer
+        render = template.render
+        if _metrics.current is not None:
+            render = _metrics.measured(_metrics.current, 'signing_string', signer.algorithm, render)
+        r.headers['Authorization'] = signer.signature_template % signer._sign(
+                render(r.headers, None, r.method, path))
         return r
+
+
+class SignedSession(Session):
+    '''
+    A requests Session that signs every request it sends using the http-signature scheme.
+
+    key_id, secret, algorithm, headers and digest_algorithm set the default key, as for HTTPSignatureAuth.
+    Other keys can be registered with add_key() and picked per request with the key_id argument
+    of request() (and get(), post()...). Each key is parsed once and its HTTPSignatureAuth, with
+    its per-host signing string templates, is reused for every request.
+
+    pool_connections is the number of hosts whose connections are kept, pool_maxsize the number
+    of connections kept per host: set it to the number of threads sharing the session, so that
+    connections are reused rather than reopened. pool_block makes threads wait for a free
+    connection instead of opening extra ones.
+
+    A SignedSession can be shared between threads as long as its settings are not changed
+    (its cookie jar is locked by requests).
+    '''
+    def __init__(self, key_id, secret, algorithm='hmac-sha256', headers=None, digest_algorithm='SHA-256',
+            pool_connections=10, pool_maxsize=DEFAULT_POOLSIZE, pool_block=False, max_retries=0):
+        super(SignedSession, self).__init__()
+        for prefix in ('https://', 'http://'):
+            self.mount(prefix, HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                                           max_retries=max_retries, pool_block=pool_block))
+        self._keys = {}
+        self._lock = threading.Lock()
+        self.auth = self.add_key(key_id, secret, algorithm, headers, digest_algorithm)
+
+    def add_key(self, key_id, secret, algorithm='hmac-sha256', headers=None, digest_algorithm='SHA-256'):
+        """Register (or replace) a signing key and return its HTTPSignatureAuth."""
+        auth = HTTPSignatureAuth(key_id=key_id, secret=secret, algorithm=algorithm,
+                                 headers=headers, digest_algorithm=digest_algorithm)
+        with self._lock:
+            self._keys[key_id] = auth
+        return auth
+
+    def request(self, method, url, *args, **kwargs):
+        """
+        As Session.request, signing with the key registered as the key_id keyword argument
+        if given instead of the default one.
+        """
+        key_id = kwargs.pop('key_id', None)
+        if key_id is not None:
+            try:
+                kwargs['auth'] = self._keys[key_id]
+            except KeyError:
+                raise HttpSigException("Unknown key id.")
+        return super(SignedSession, self).request(method, url, *args, **kwargs)
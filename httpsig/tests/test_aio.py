@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import unittest
+
+try:
+    from httpsig import aio
+except ImportError:
+    aio = None
+from httpsig.sign import HeaderSigner
+from httpsig.verify import SignatureVerifier
+from httpsig.keystore import KeyStore
+from httpsig.prevalidation import RequestRejected
+from httpsig.utils import HttpSigException
+
+
+@unittest.skipIf(aio is None, "asyncio (or trollius) and futures are required")
+class TestAio(unittest.TestCase):
+    def setUp(self):
+        private_key_path = os.path.join(os.path.dirname(__file__), 'rsa_private.pem')
+        self.private_key = open(private_key_path, 'r').read()
+        public_key_path = os.path.join(os.path.dirname(__file__), 'rsa_public.pem')
+        self.public_key = open(public_key_path, 'r').read()
+        self.hmac_secret = "something special goes here"
+
+        self.loop = aio.asyncio.new_event_loop()
+        self.engine = SignatureVerifier(KeyStore())
+        self.unsigned = {
+            'Date': 'Thu, 05 Jan 2012 21:31:40 GMT'
+        }
+
+    def tearDown(self):
+        self.loop.close()
+
+    def fetcher(self, secrets):
+        self.fetched = []
+        def fetch(key_id):
+            self.fetched.append(key_id)
+            future = aio.asyncio.Future(loop=self.loop)
+            self.loop.call_soon(future.set_result, secrets.get(key_id))
+            return future
+        return fetch
+
+    def wait(self, future):
+        return self.loop.run_until_complete(future)
+
+    def test_hmac(self):
+        hs = HeaderSigner(key_id='hmac', secret=self.hmac_secret, algorithm='hmac-sha256')
+        signed = self.wait(aio.sign(hs, self.unsigned, loop=self.loop))
+        fetch = self.fetcher({'hmac': self.hmac_secret})
+        self.assertTrue(self.wait(aio.verify(self.engine, signed, key_fetcher=fetch, loop=self.loop)))
+        self.assertTrue(self.wait(aio.verify(self.engine, signed, key_fetcher=fetch, loop=self.loop)))
+        self.assertEqual(self.fetched, ['hmac'])
+
+    def test_rsa(self):
+        hs = HeaderSigner(key_id='rsa', secret=self.private_key)
+        signed = self.wait(aio.sign(hs, self.unsigned, loop=self.loop))
+        fetch = self.fetcher({'rsa': self.public_key})
+        self.assertTrue(self.wait(aio.verify(self.engine, signed, key_fetcher=fetch, loop=self.loop)))
+        signed['Date'] = 'Fri, 06 Jan 2012 21:31:40 GMT'
+        self.assertFalse(self.wait(aio.verify(self.engine, signed, key_fetcher=fetch, loop=self.loop)))
+
+    def test_fetched_public_key_as_hmac(self):
+        hs = HeaderSigner(key_id='rsa', secret=self.public_key, algorithm='hmac-sha256')
+        signed = hs.sign(self.unsigned)
+        fetch = self.fetcher({'rsa': self.public_key})
+        with self.assertRaises(HttpSigException):
+            self.wait(aio.verify(self.engine, signed, key_fetcher=fetch, loop=self.loop))
+
+    def test_unknown_key(self):
+        hs = HeaderSigner(key_id='nobody', secret=self.hmac_secret, algorithm='hmac-sha256')
+        signed = hs.sign(self.unsigned)
+        with self.assertRaises(RequestRejected) as cm:
+            self.wait(aio.verify(self.engine, signed, key_fetcher=self.fetcher({}), loop=self.loop))
+        self.assertEqual(cm.exception.stage, 'key_id')
+
+    def test_fetched_key_expires(self):
+        # fetched keys are not registered for good, so that revoked keys stop being trusted
+        self.now = 0
+        engine = SignatureVerifier(KeyStore(loader_ttl=60, clock=lambda: self.now))
+        hs = HeaderSigner(key_id='hmac', secret=self.hmac_secret, algorithm='hmac-sha256')
+        signed = hs.sign(self.unsigned)
+        secrets = {'hmac': self.hmac_secret}
+        fetch = self.fetcher(secrets)
+        self.assertTrue(self.wait(aio.verify(engine, signed, key_fetcher=fetch, loop=self.loop)))
+        self.assertEqual(engine.keystore._secrets, {})
+        del secrets['hmac']
+        self.assertTrue(self.wait(aio.verify(engine, signed, key_fetcher=fetch, loop=self.loop)))
+        self.now += 60
+        with self.assertRaises(RequestRejected):
+            self.wait(aio.verify(engine, signed, key_fetcher=fetch, loop=self.loop))
+        self.assertEqual(self.fetched, ['hmac', 'hmac'])
+
+    def test_policy_error(self):
+        with self.assertRaises(HttpSigException):
+            self.wait(aio.verify(self.engine, self.unsigned, loop=self.loop))
@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import hashlib
+import hmac
+import unittest
+
+from Crypto.Hash import SHA256
+from Crypto.PublicKey import RSA
+from Crypto.Signature import PKCS1_v1_5
+
+from httpsig import backends
+from httpsig.backends import get_backend, available_backends, HMACKey, BLINDINGS
+from httpsig.sign import Signer, HeaderSigner
+from httpsig.verify import Verifier, HeaderVerifier
+from httpsig.utils import HttpSigException
+
+
+class TestBackends(unittest.TestCase):
+    def setUp(self):
+        private_key_path = os.path.join(os.path.dirname(__file__), 'rsa_private.pem')
+        self.private_key = open(private_key_path, 'r').read()
+        public_key_path = os.path.join(os.path.dirname(__file__), 'rsa_public.pem')
+        self.public_key = open(public_key_path, 'r').read()
+        self.hmac_secret = "something special goes here"
+        self.backends = available_backends()
+
+    def secrets(self, algorithm):
+        if algorithm.startswith('rsa'):
+            return self.private_key, self.public_key
+        return self.hmac_secret, self.hmac_secret
+
+    def test_default(self):
+        self.assertEqual(get_backend().name, self.backends[0])
+
+    def test_interoperable(self):
+        # both RSA PKCS#1 v1.5 and HMAC are deterministic, so every backend must produce the same bytes
+        for algorithm in ('rsa-sha1', 'rsa-sha256', 'rsa-sha512', 'hmac-sha1', 'hmac-sha256', 'hmac-sha512'):
+            sign_secret, verify_secret = self.secrets(algorithm)
+            signatures = set()
+            for sign_backend in self.backends:
+                signature = Signer(sign_secret, algorithm, backend=sign_backend)._sign("this is a test")
+                signatures.add(signature)
+                for verify_backend in self.backends:
+                    verifier = Verifier(verify_secret, algorithm, backend=verify_backend)
+                    self.assertTrue(verifier._verify("this is a test", signature))
+                    self.assertFalse(verifier._verify("this is not a test", signature))
+            self.assertEqual(len(signatures), 1)
+
+    def read(self, name):
+        return open(os.path.join(os.path.dirname(__file__), name), 'r').read()
+
+    def test_rsa_pss(self):
+        private_key, public_key = self.read('rsa2048_private.pem'), self.read('rsa2048_public.pem')
+        # PSS signatures are randomized: check that every backend verifies those of the others
+        for sign_backend in self.backends:
+            signature = Signer(private_key, 'rsa-pss-sha512', backend=sign_backend)._sign("this is a test")
+            for verify_backend in self.backends:
+                verifier = Verifier(public_key, 'rsa-pss-sha512', backend=verify_backend)
+                self.assertTrue(verifier._verify("this is a test", signature))
+                self.assertFalse(verifier._verify("this is not a test", signature))
+            # not a PKCS#1 v1.5 signature
+            self.assertFalse(Verifier(public_key, 'rsa-sha512', backend=sign_backend)._verify("this is a test", signature))
+            # 1024 bits cannot hold a SHA-512 hash and salt
+            with self.assertRaises(HttpSigException):
+                Signer(self.private_key, 'rsa-pss-sha512', backend=sign_backend)
+
+    def test_ed25519(self):
+        private_key, public_key = self.read('ed25519_private.pem'), self.read('ed25519_public.pem')
+        if 'cryptography' in self.backends:
+            signer = Signer(private_key, 'ed25519', backend='cryptography')
+            signature = signer._sign("this is a test")
+            # deterministic, and 64 bytes long
+            self.assertEqual(signer._sign("this is a test"), signature)
+            self.assertEqual(len(signature), 88)
+            verifier = Verifier(public_key, 'ed25519', backend='cryptography')
+            self.assertTrue(verifier._verify("this is a test", signature))
+            self.assertFalse(verifier._verify("this is not a test", signature))
+            with self.assertRaises(HttpSigException):
+                Verifier(self.public_key, 'ed25519', backend='cryptography')
+        if 'pycrypto' in self.backends:
+            with self.assertRaises(HttpSigException):
+                Signer(private_key, 'ed25519', backend='pycrypto')
+
+    def test_ecdsa(self):
+        private_key, public_key = self.read('ecdsa_private.pem'), self.read('ecdsa_public.pem')
+        if 'cryptography' in self.backends:
+            signature = Signer(private_key, 'ecdsa-sha256', backend='cryptography')._sign("this is a test")
+            verifier = Verifier(public_key, 'ecdsa-sha256', backend='cryptography')
+            self.assertTrue(verifier._verify("this is a test", signature))
+            self.assertFalse(verifier._verify("this is not a test", signature))
+            self.assertFalse(verifier._verify("this is a test", signature[:-4] + 'AAA='))
+            # P-256 keys only
+            from cryptography.hazmat.backends import default_backend
+            from cryptography.hazmat.primitives import serialization
+            from cryptography.hazmat.primitives.asymmetric import ec
+            p384 = ec.generate_private_key(ec.SECP384R1(), default_backend()).public_key().public_bytes(
+                serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo)
+            for secret in (p384, self.public_key):
+                with self.assertRaises(HttpSigException):
+                    Verifier(secret, 'ecdsa-sha256', backend='cryptography')
+        if 'pycrypto' in self.backends:
+            with self.assertRaises(HttpSigException):
+                Verifier(public_key, 'ecdsa-sha256', backend='pycrypto')
+
+    def test_rsa_blinding(self):
+        # PKCS#1 v1.5 is deterministic: every blinding must give pycrypto's own signatures,
+        # also past the point where precomputed factors are redrawn
+        expected = [PKCS1_v1_5.new(RSA.importKey(self.private_key)).sign(SHA256.new("message %d" % i))
+                    for i in range(40)]
+        if 'pycrypto' in self.backends:
+            for blinding in BLINDINGS:
+                signer = Signer(self.private_key, 'rsa-sha256', backend='pycrypto', blinding=blinding)
+                self.assertEqual([signer._key.sign("message %d" % i) for i in range(40)], expected)
+            for blinding in ('sometimes', 'none'):
+                with self.assertRaises(HttpSigException):
+                    Signer(self.private_key, 'rsa-sha256', backend='pycrypto', blinding=blinding)
+        if 'cryptography' in self.backends:
+            signer = Signer(self.private_key, 'rsa-sha256', backend='cryptography', blinding='precomputed')
+            self.assertEqual(signer._key.sign("message 0"), expected[0])
+            with self.assertRaises(HttpSigException):
+                Signer(self.private_key, 'rsa-sha256', backend='cryptography', blinding='random')
+        with self.assertRaises(HttpSigException):
+            Signer(self.hmac_secret, 'hmac-sha256', blinding='random')
+
+    def test_rsa_signing_checked(self):
+        # the pycrypto signing key is checked against PKCS1_v1_5 when loaded
+        if 'pycrypto' not in self.backends:
+            return
+        prefixes = backends._DIGEST_INFO_PREFIXES
+        backends._DIGEST_INFO_PREFIXES = dict(prefixes, sha256=prefixes['sha1'])
+        try:
+            with self.assertRaises(HttpSigException):
+                Signer(self.private_key, 'rsa-sha256', backend='pycrypto')
+        finally:
+            backends._DIGEST_INFO_PREFIXES = prefixes
+
+    def test_rsa_crt(self):
+        if 'pycrypto' not in self.backends:
+            return
+        backend = get_backend('pycrypto')
+        key = RSA.importKey(self.private_key)
+        # without its factors, as from a JWK holding only n, e and d
+        recovered = backend._crt_key(RSA.construct((key.n, key.e, key.d)))
+        self.assertEqual(set([recovered.p, recovered.q]), set([key.p, key.q]))
+        with self.assertRaises(HttpSigException):
+            backend._crt_key(RSA.construct((key.n, key.e, key.d, key.p, key.q, key.u + 1)))
+
+    def test_wrong_key_type(self):
+        # keys of another scheme are rejected when loaded, not when used
+        if 'cryptography' not in self.backends:
+            return
+        keys = {'rsa': self.read('rsa_public.pem'), 'ecdsa': self.read('ecdsa_public.pem'),
+                'ed25519': self.read('ed25519_public.pem')}
+        schemes = {'rsa-sha256': 'rsa', 'rsa-pss-sha512': 'rsa', 'ecdsa-sha256': 'ecdsa', 'ed25519': 'ed25519'}
+        for algorithm, scheme in schemes.items():
+            for key_scheme, key in keys.items():
+                if key_scheme != scheme:
+                    with self.assertRaises(HttpSigException):
+                        Verifier(key, algorithm, backend='cryptography')
+
+    def test_hmac_key(self):
+        # keys shorter than, equal to and longer than the block size
+        for secret in ('', 'key', 'k' * 64, 'k' * 200):
+            for digestmod in (hashlib.sha1, hashlib.sha256, hashlib.sha512):
+                key = HMACKey(secret, digestmod)
+                expected = hmac.new(secret, "this is a test", digestmod).digest()
+                self.assertEqual(key.mac("this is a test"), expected)
+                self.assertEqual(key.mac("this is a test"), expected)
+                self.assertTrue(key.verify("this is a test", expected))
+                self.assertFalse(key.verify("this is a test", expected[:-1] + 'x'))
+                self.assertFalse(key.verify("this is a test", expected[:-1]))
+
+    def test_headers(self):
+        unsigned = {
+            'Date': 'Thu, 05 Jan 2012 21:31:40 GMT'
+        }
+        for backend in self.backends:
+            hs = HeaderSigner(key_id='Test', secret=self.private_key, backend=backend)
+            hv = HeaderVerifier(hs.sign(unsigned), secret=self.public_key, backend=backend)
+            self.assertEqual(hv.backend.name, backend)
+            self.assertTrue(hv.verify())
+
+    def test_unicode_key(self):
+        unsigned = {
+            'Date': 'Thu, 05 Jan 2012 21:31:40 GMT'
+        }
+        for backend in self.backends:
+            hs = HeaderSigner(key_id='Test', secret=self.private_key, backend=backend)
+            hv = HeaderVerifier(hs.sign(unsigned), secret=unicode(self.public_key), backend=backend)
+            self.assertTrue(hv.verify())
+            with self.assertRaises(HttpSigException):
+                Verifier(u'\u00e9' + self.public_key, 'rsa-sha256', backend=backend)
+
+    def test_invalid_key(self):
+        for backend in self.backends:
+            with self.assertRaises(HttpSigException):
+                Signer("not a key", 'rsa-sha256', backend=backend)
+
+    def test_sign_with_public_key(self):
+        for backend in self.backends:
+            signer = Signer(self.public_key, 'rsa-sha256', backend=backend)
+            with self.assertRaises(Exception):
+                signer._sign("this is a test")
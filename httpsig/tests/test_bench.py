@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import json
+import unittest
+from StringIO import StringIO
+
+from httpsig import bench
+from httpsig.utils import ALGORITHMS
+
+
+class TestBench(unittest.TestCase):
+
+    def test_cases(self):
+        names = [name for suite in bench.SUITE for name, _ in suite()]
+        for algorithm in ALGORITHMS:
+            self.assertIn('sign %s' % algorithm, names)
+            self.assertIn('verify %s' % algorithm, names)
+        for bits in bench.RSA_KEY_SIZES:
+            self.assertIn('sign rsa-sha256 %d' % bits, names)
+        self.assertEqual(len(names), len(set(names)))
+
+    def test_json(self):
+        stdout = sys.stdout
+        sys.stdout = StringIO()
+        try:
+            bench.main(['--json', '-k', 'hmac-sha1', '--min-time', '0.01'])
+            output = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+        results = json.loads(output)['results']
+        self.assertEqual([r['name'] for r in results], ['sign hmac-sha1', 'verify hmac-sha1'])
+        for r in results:
+            self.assertGreater(r['ops_per_sec'], 0)
+            self.assertLessEqual(r['p50_us'], r['p99_us'])
+            self.assertGreaterEqual(r['gc_objects_per_op'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import unittest
+
+from httpsig.sign import HeaderSigner
+from httpsig.verify import HeaderVerifier, SignatureVerifier
+from httpsig.keystore import KeyStore
+from httpsig.cache import VerificationCache
+from httpsig.utils import parse_http_date
+
+
+class TestVerificationCache(unittest.TestCase):
+    def setUp(self):
+        self.secret = "something special goes here"
+        self.date = 'Thu, 05 Jan 2012 21:31:40 GMT'
+        self.now = parse_http_date(self.date) + 10
+
+        self.keystore = KeyStore({'Test': self.secret})
+        self.cache = VerificationCache(self.keystore, max_age=60, clock=lambda: self.now)
+        self.engine = SignatureVerifier(self.keystore, cache=self.cache)
+        self.signer = HeaderSigner(key_id='Test', secret=self.secret, algorithm='hmac-sha256')
+        self.signed = self.signer.sign({'Date': self.date})
+
+    def test_hits(self):
+        for _ in range(3):
+            self.assertTrue(self.engine.verify(self.signed))
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 1))
+
+    def test_failures_not_cached(self):
+        signed = self.signer.sign({'Date': self.date})
+        signed['Date'] = 'Fri, 06 Jan 2012 21:31:40 GMT'
+        for _ in range(2):
+            self.assertFalse(self.engine.verify(signed))
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 2))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_date_age(self):
+        self.assertTrue(self.engine.verify(self.signed))
+        self.now += 49
+        self.assertTrue(self.engine.verify(self.signed))
+        self.assertEqual(self.cache.hits, 1)
+        self.now += 1
+        self.assertTrue(self.engine.verify(self.signed))
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_stale_date_not_cached(self):
+        self.now += 3600
+        self.assertTrue(self.engine.verify(self.signed))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_future_date(self):
+        self.now -= 3600
+        self.assertTrue(self.engine.verify(self.signed))
+        self.now += 60
+        self.assertTrue(self.engine.verify(self.signed))
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 2))
+
+    def test_rotation(self):
+        self.assertTrue(self.engine.verify(self.signed))
+        self.keystore.add('Test', 'a brand new secret')
+        self.assertEqual(len(self.cache), 0)
+        self.assertFalse(self.engine.verify(self.signed))
+
+    def test_rotation_during_verify(self):
+        # a verification overlapping a rotation is not cached
+        def verify(params, signable):
+            self.keystore.add('Test', 'a brand new secret')
+            return True
+        params = self.engine._prepare(self.signed, None, None, None)[0]
+        self.assertTrue(self.cache.check(params, 'signable', self.date, verify))
+        self.assertEqual(len(self.cache), 0)
+        self.assertTrue(self.cache.check(params, 'signable', self.date, lambda params, signable: True))
+        self.assertEqual(len(self.cache), 1)
+
+    def test_header_verifier(self):
+        for _ in range(2):
+            hv = HeaderVerifier(self.signed, keystore=self.keystore, cache=self.cache)
+            self.assertTrue(hv.verify())
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
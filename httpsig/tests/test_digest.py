@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import base64
+import hashlib
+import tempfile
+import unittest
+from StringIO import StringIO
+
+from httpsig.digest import digest_body, digest_file, DigestValidator, SpooledBody
+from httpsig.utils import HttpSigException
+
+try:
+    import requests
+    from httpsig.requests_auth import HTTPSignatureAuth
+except ImportError:
+    requests = None
+
+
+class TestDigest(unittest.TestCase):
+    def setUp(self):
+        self.body = b'{"hello": "world"}' * 10000
+        self.digest = 'SHA-256=' + base64.b64encode(hashlib.sha256(self.body).digest())
+
+    def chunks(self):
+        for i in range(0, len(self.body), 1000):
+            yield self.body[i:i + 1000]
+
+    def test_bytes(self):
+        body, digest = digest_body(self.body)
+        self.assertIs(body, self.body)
+        self.assertEqual(digest, self.digest)
+        self.assertEqual(digest_body(None)[1], 'SHA-256=47DEQpj8HBSa+/TImW+5JCeuQeRkm5NMpJWZG3hSuFU=')
+
+    def test_unicode(self):
+        body, digest = digest_body(u'{"hello": "world"}' * 10000)
+        self.assertEqual((body, digest), (self.body, self.digest))
+        self.assertIs(type(body), bytes)
+        with self.assertRaises(HttpSigException):
+            digest_body(u'caf\xe9')
+
+    def test_sha512(self):
+        body, digest = digest_body(self.body, 'SHA-512')
+        self.assertEqual(digest, 'SHA-512=' + base64.b64encode(hashlib.sha512(self.body).digest()))
+        with self.assertRaises(HttpSigException):
+            digest_body(self.body, 'MD5')
+
+    def test_file(self):
+        f = tempfile.TemporaryFile()
+        f.write(b'prefix' + self.body)
+        f.seek(6)
+        body, digest = digest_body(f, chunk_size=4096)
+        self.assertIs(body, f)
+        self.assertEqual(digest, self.digest)
+        self.assertEqual(f.tell(), 6)
+
+    def test_digest_file(self):
+        f = tempfile.NamedTemporaryFile()
+        f.write(self.body)
+        f.flush()
+        self.assertEqual(digest_file(f.name), self.digest)
+
+        fd = os.open(f.name, os.O_RDONLY)
+        try:
+            # hashed from the current position, like digest_body
+            os.lseek(fd, 10, os.SEEK_SET)
+            self.assertEqual(digest_file(fd, 'SHA-512'),
+                             'SHA-512=' + base64.b64encode(hashlib.sha512(self.body[10:]).digest()))
+            self.assertEqual(os.lseek(fd, 0, os.SEEK_CUR), 10)
+            with open(f.name, 'rb') as body:
+                body.seek(10)
+                self.assertEqual(digest_file(fd), digest_body(body)[1])
+        finally:
+            os.close(fd)
+
+    def test_digest_file_fallback(self):
+        f = tempfile.NamedTemporaryFile()
+        self.assertEqual(digest_file(f.name), digest_body(b'')[1])
+        f.seek(5)
+        self.assertEqual(digest_file(f.fileno()), digest_body(b'')[1])
+        self.assertEqual(os.lseek(f.fileno(), 0, os.SEEK_CUR), 5)
+        r, w = os.pipe()
+        os.write(w, self.body[:4096])
+        os.close(w)
+        try:
+            self.assertEqual(digest_file(r), digest_body(self.body[:4096])[1])
+        finally:
+            os.close(r)
+
+    def test_iterator(self):
+        body, digest = digest_body(self.chunks())
+        self.assertIsInstance(body, SpooledBody)
+        self.assertEqual(digest, self.digest)
+        self.assertEqual(len(body), len(self.body))
+        self.assertEqual(b''.join(body), self.body)
+
+    def test_validator(self):
+        validator = DigestValidator('sha-512=abc, SHA-256=%s' % self.digest.split('=', 1)[1])
+        self.assertEqual(validator.algorithm, 'SHA-512')
+        validator = DigestValidator(self.digest)
+        self.assertEqual(b''.join(validator.validate(self.chunks())), self.body)
+        self.assertTrue(validator.valid())
+
+    def test_validator_mismatch(self):
+        validator = DigestValidator(self.digest)
+        with self.assertRaises(HttpSigException):
+            for _ in validator.validate(StringIO(self.body + b'tampered')):
+                pass
+
+    @unittest.skipIf(requests is None, "requests is required")
+    def test_requests_auth(self):
+        auth = HTTPSignatureAuth(key_id='Test', secret='something special goes here',
+                                 headers=['date', 'digest'])
+        r = requests.Request('POST', 'http://example.com/upload', data=self.chunks(), auth=auth,
+                             headers={'Date': 'Thu, 05 Jan 2012 21:31:40 GMT'}).prepare()
+        self.assertEqual(r.headers['Digest'], self.digest)
+        self.assertIn('headers="date digest"', r.headers['Authorization'])
+        self.assertEqual(b''.join(r.body), self.body)
+
+        r = requests.Request('POST', 'http://example.com/upload', data=u'caf\xe9', auth=auth,
+                             headers={'Date': 'Thu, 05 Jan 2012 21:31:40 GMT'})
+        with self.assertRaises(HttpSigException):
+            r.prepare()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import unittest
+
+from httpsig.sign import HeaderSigner
+from httpsig.verify import HeaderVerifier, SignatureVerifier
+from httpsig.keystore import KeyStore
+from httpsig.utils import HttpSigException
+
+
+class TestKeyStore(unittest.TestCase):
+    def setUp(self):
+        self.hmac_secret = "something special goes here"
+        private_key_path = os.path.join(os.path.dirname(__file__), 'rsa_private.pem')
+        self.private_key = open(private_key_path, 'r').read()
+        public_key_path = os.path.join(os.path.dirname(__file__), 'rsa_public.pem')
+        self.public_key = open(public_key_path, 'r').read()
+
+        self.keystore = KeyStore({
+            'hmac-key': self.hmac_secret,
+            'rsa-key': (self.public_key, 'rsa-sha256'),
+        })
+        self.unsigned = {
+            'Date': 'Thu, 05 Jan 2012 21:31:40 GMT'
+        }
+
+    def test_parses_once(self):
+        v1 = self.keystore.get_verifier('rsa-key', 'rsa-sha256')
+        v2 = self.keystore.get_verifier('rsa-key', 'rsa-sha256')
+        self.assertIs(v1, v2)
+
+    def test_verify_hmac(self):
+        hs = HeaderSigner(key_id='hmac-key', secret=self.hmac_secret, algorithm='hmac-sha256')
+        signed = hs.sign(self.unsigned)
+        hv = HeaderVerifier(headers=signed, keystore=self.keystore)
+        self.assertTrue(hv.verify())
+
+    def test_verify_rsa(self):
+        hs = HeaderSigner(key_id='rsa-key', secret=self.private_key, algorithm='rsa-sha256')
+        signed = hs.sign(self.unsigned)
+        hv = HeaderVerifier(headers=signed, keystore=self.keystore)
+        self.assertTrue(hv.verify())
+
+    def test_unknown_key(self):
+        hs = HeaderSigner(key_id='nobody', secret=self.hmac_secret, algorithm='hmac-sha256')
+        signed = hs.sign(self.unsigned)
+        with self.assertRaises(HttpSigException):
+            HeaderVerifier(headers=signed, keystore=self.keystore)
+
+    def test_pinned_algorithm(self):
+        # an RSA public key must never be accepted as an HMAC secret
+        hs = HeaderSigner(key_id='rsa-key', secret=self.public_key, algorithm='hmac-sha256')
+        signed = hs.sign(self.unsigned)
+        with self.assertRaises(HttpSigException):
+            HeaderVerifier(headers=signed, keystore=self.keystore)
+
+    def test_unpinned_public_key(self):
+        # an unpinned public key is not an HMAC secret either
+        keystore = KeyStore({'rsa-key': self.public_key, 'hmac-key': self.hmac_secret})
+        hs = HeaderSigner(key_id='rsa-key', secret=self.public_key, algorithm='hmac-sha256')
+        with self.assertRaises(HttpSigException):
+            HeaderVerifier(headers=hs.sign(self.unsigned), keystore=keystore)
+        hs = HeaderSigner(key_id='rsa-key', secret=self.private_key, algorithm='rsa-sha256')
+        self.assertTrue(HeaderVerifier(headers=hs.sign(self.unsigned), keystore=keystore).verify())
+        with self.assertRaises(HttpSigException):
+            keystore.get_verifier('hmac-key', 'rsa-sha256')
+
+    def test_invalidate(self):
+        v1 = self.keystore.get_verifier('hmac-key', 'hmac-sha256')
+        self.keystore.invalidate('hmac-key')
+        v2 = self.keystore.get_verifier('hmac-key', 'hmac-sha256')
+        self.assertIsNot(v1, v2)
+
+    def test_rotate(self):
+        hs = HeaderSigner(key_id='hmac-key', secret=self.hmac_secret, algorithm='hmac-sha256')
+        signed = hs.sign(self.unsigned)
+        self.assertTrue(HeaderVerifier(headers=signed, keystore=self.keystore).verify())
+        self.keystore.add('hmac-key', 'a brand new secret')
+        self.assertFalse(HeaderVerifier(headers=signed, keystore=self.keystore).verify())
+
+    def test_remove(self):
+        self.keystore.get_verifier('hmac-key', 'hmac-sha256')
+        self.keystore.remove('hmac-key')
+        self.assertNotIn('hmac-key', self.keystore)
+        with self.assertRaises(HttpSigException):
+            self.keystore.get_verifier('hmac-key', 'hmac-sha256')
+
+    def test_loader(self):
+        calls = []
+        def loader(key_id):
+            calls.append(key_id)
+            return self.hmac_secret if key_id == 'loaded' else None
+        keystore = KeyStore(loader=loader)
+        keystore.get_verifier('loaded', 'hmac-sha1')
+        keystore.get_verifier('loaded', 'hmac-sha1')
+        self.assertEqual(calls, ['loaded'])
+        with self.assertRaises(HttpSigException):
+            keystore.get_verifier('missing', 'hmac-sha1')
+
+    def test_loader_cached(self):
+        # the loader stays off the hot path, also for unknown keyIds
+        calls = []
+        def loader(key_id):
+            calls.append(key_id)
+            return self.hmac_secret if key_id == 'loaded' else None
+        engine = SignatureVerifier(KeyStore(loader=loader))
+        hs = HeaderSigner(key_id='loaded', secret=self.hmac_secret, algorithm='hmac-sha256')
+        signed = hs.sign(self.unsigned)
+        for _ in range(5):
+            self.assertTrue(engine.verify(signed))
+        unknown = HeaderSigner(key_id='missing', secret=self.hmac_secret, algorithm='hmac-sha256').sign(self.unsigned)
+        for _ in range(5):
+            with self.assertRaises(HttpSigException):
+                engine.verify(unknown)
+        self.assertEqual(calls, ['loaded', 'missing'])
+        engine.keystore.invalidate('loaded')
+        self.assertTrue(engine.verify(signed))
+        self.assertEqual(calls, ['loaded', 'missing', 'loaded'])
+
+    def test_unknown_flood(self):
+        # unknown keyIds do not evict the keys the loader returned
+        calls = []
+        def loader(key_id):
+            calls.append(key_id)
+            return self.hmac_secret if key_id == 'good' else None
+        keystore = KeyStore(loader=loader, maxsize=4)
+        engine = SignatureVerifier(keystore)
+        signed = HeaderSigner(key_id='good', secret=self.hmac_secret, algorithm='hmac-sha256').sign(self.unsigned)
+        for i in range(10):
+            self.assertTrue(engine.verify(signed))
+            for j in range(20):
+                self.assertNotIn('junk%d-%d' % (i, j), keystore)
+        self.assertEqual(calls.count('good'), 1)
+        self.assertEqual(len(keystore._unknown), 4)
+
+    def test_preload(self):
+        # only the pinned key can be parsed ahead of its first request
+        self.assertEqual(self.keystore.preload(), 1)
+        self.assertEqual(self.keystore._cache.keys(), ['rsa-key'])
+        verifier = self.keystore._cache.get('rsa-key')['rsa-sha256']
+        self.assertIs(self.keystore.get_verifier('rsa-key', 'rsa-sha256'), verifier)
+        self.assertEqual(self.keystore.preload(['hmac-key', 'nobody']), 0)
+
+    def test_bounded(self):
+        keystore = KeyStore(dict(('key%d' % i, self.hmac_secret) for i in range(10)), maxsize=4)
+        for i in range(10):
+            keystore.get_verifier('key%d' % i, 'hmac-sha256')
+        self.assertEqual(len(keystore._cache), 4)
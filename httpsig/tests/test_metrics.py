@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import unittest
+
+try:
+    import prometheus_client
+except ImportError:
+    prometheus_client = None
+
+from httpsig import metrics
+from httpsig.sign import HeaderSigner
+from httpsig.verify import HeaderVerifier, SignatureVerifier
+from httpsig.keystore import KeyStore
+from httpsig.replay import ReplayGuard
+from httpsig.prevalidation import RequestRejected
+from httpsig.utils import parse_http_date
+
+
+class RecordingMetrics(metrics.Metrics):
+    def __init__(self):
+        self.stages = []
+        self.signatures = []
+        self.verifications = []
+
+    def observe(self, stage, algorithm, seconds):
+        assert seconds >= 0
+        self.stages.append((stage, algorithm))
+
+    def signed(self, algorithm):
+        self.signatures.append(algorithm)
+
+    def verified(self, algorithm, reason=None):
+        self.verifications.append((algorithm, reason))
+
+
+class TestMetrics(unittest.TestCase):
+    date = 'Thu, 05 Jan 2012 21:31:40 GMT'
+
+    def setUp(self):
+        self.secret = 'something special goes here'
+        self.private_key = open(os.path.join(os.path.dirname(__file__), 'rsa_private.pem'), 'r').read()
+        self.public_key = open(os.path.join(os.path.dirname(__file__), 'rsa_public.pem'), 'r').read()
+        self.signer = HeaderSigner(key_id='hmac', secret=self.secret, algorithm='hmac-sha256')
+        self.metrics = RecordingMetrics()
+        metrics.set_metrics(self.metrics)
+
+    def tearDown(self):
+        metrics.set_metrics(None)
+
+    def test_sign(self):
+        self.signer.sign({'Date': self.date})
+        self.assertEqual(self.metrics.stages, [('signing_string', 'hmac-sha256'), ('hash', 'hmac-sha256')])
+        self.assertEqual(self.metrics.signatures, ['hmac-sha256'])
+
+    def test_header_verifier(self):
+        signed = self.signer.sign({'Date': self.date})
+        del self.metrics.stages[:]
+        self.assertTrue(HeaderVerifier(signed, secret=self.secret).verify())
+        self.assertEqual([stage for stage, _ in self.metrics.stages], ['parse', 'key_lookup', 'signing_string', 'hash'])
+        self.assertFalse(HeaderVerifier(signed, secret='wrong').verify())
+        self.assertEqual(self.metrics.verifications, [('hmac-sha256', None), ('hmac-sha256', 'bad_signature')])
+
+    def test_rsa(self):
+        hs = HeaderSigner(key_id='rsa', secret=self.private_key, algorithm='rsa-sha256')
+        signed = hs.sign({'Date': self.date})
+        self.assertTrue(HeaderVerifier(signed, secret=self.public_key).verify())
+        self.assertEqual([stage for stage, _ in self.metrics.stages].count('rsa'), 2)
+
+    def test_signature_verifier(self):
+        now = parse_http_date(self.date)
+        engine = SignatureVerifier(KeyStore({'hmac': self.secret}),
+                                   replay_guard=ReplayGuard(clock=lambda: now))
+        signed = self.signer.sign({'Date': self.date})
+        self.assertTrue(engine.verify(signed))
+        with self.assertRaises(RequestRejected):
+            engine.verify(signed)
+        unknown = HeaderSigner(key_id='unknown', secret=self.secret, algorithm='hmac-sha256').sign({'Date': self.date})
+        with self.assertRaises(RequestRejected):
+            engine.verify(unknown)
+        with self.assertRaises(RequestRejected):
+            engine.verify({'Date': self.date})
+        self.assertEqual(self.metrics.verifications, [('hmac-sha256', None), ('hmac-sha256', 'replay'),
+                                                      ('hmac-sha256', 'key_id'), (None, 'syntax')])
+        self.assertIn(('key_lookup', 'hmac-sha256'), self.metrics.stages)
+
+    def test_unknown_algorithm(self):
+        # labels stay bounded whatever algorithm requests claim
+        engine = SignatureVerifier(KeyStore({'hmac': self.secret}))
+        for i in range(3):
+            junk = {'Date': self.date, 'Authorization': 'Signature keyId="hmac",algorithm="junk%d",signature="abc"' % i}
+            with self.assertRaises(RequestRejected):
+                engine.verify(junk)
+            with self.assertRaises(Exception):
+                HeaderVerifier(junk, secret=self.secret)
+        labels = set(algorithm for algorithm, _ in self.metrics.verifications)
+        labels.update(algorithm for _, algorithm in self.metrics.stages)
+        self.assertEqual(labels, set(['other']))
+
+    def test_disabled(self):
+        metrics.set_metrics(None)
+        signed = self.signer.sign({'Date': self.date})
+        self.assertTrue(HeaderVerifier(signed, secret=self.secret).verify())
+        self.assertEqual(self.metrics.stages + self.metrics.signatures + self.metrics.verifications, [])
+
+    @unittest.skipIf(prometheus_client is None, "prometheus_client is required")
+    def test_prometheus(self):
+        registry = prometheus_client.CollectorRegistry()
+        metrics.set_metrics(metrics.PrometheusMetrics(registry=registry))
+        signed = self.signer.sign({'Date': self.date})
+        HeaderVerifier(signed, secret=self.secret).verify()
+        HeaderVerifier(signed, secret='wrong').verify()
+        value = registry.get_sample_value
+        self.assertEqual(value('httpsig_signatures_total', {'algorithm': 'hmac-sha256'}), 1)
+        self.assertEqual(value('httpsig_verifications_total',
+                               {'algorithm': 'hmac-sha256', 'result': 'success', 'reason': ''}), 1)
+        self.assertEqual(value('httpsig_verifications_total',
+                               {'algorithm': 'hmac-sha256', 'result': 'failure', 'reason': 'bad_signature'}), 1)
+        self.assertEqual(value('httpsig_stage_seconds_count', {'stage': 'hash', 'algorithm': 'hmac-sha256'}), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
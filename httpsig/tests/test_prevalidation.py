@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import unittest
+
+from httpsig.sign import HeaderSigner
+from httpsig.verify import HeaderVerifier, SignatureVerifier
+from httpsig.keystore import KeyStore
+from httpsig.replay import ReplayGuard
+from httpsig.prevalidation import PreValidator, RequestRejected
+from httpsig.utils import parse_http_date
+
+
+class CountingKeyStore(KeyStore):
+    """KeyStore recording the keys it is asked to parse."""
+    def __init__(self, *args, **kwargs):
+        super(CountingKeyStore, self).__init__(*args, **kwargs)
+        self.parsed = []
+
+    def get_verifier(self, key_id, algorithm):
+        self.parsed.append(key_id)
+        return super(CountingKeyStore, self).get_verifier(key_id, algorithm)
+
+
+class TestPreValidator(unittest.TestCase):
+    date = 'Thu, 05 Jan 2012 21:31:40 GMT'
+
+    def setUp(self):
+        self.secret = 'something special goes here'
+        self.keystore = CountingKeyStore({'hmac': self.secret})
+        self.now = parse_http_date(self.date)
+        self.engine = SignatureVerifier(self.keystore, required_headers=['date', 'digest'],
+                                        algorithms=['hmac-sha256', 'rsa-sha256'],
+                                        replay_guard=ReplayGuard(max_skew=60, clock=lambda: self.now))
+        self.headers = {'Date': self.date, 'Digest': 'SHA-256=abc'}
+
+    def sign(self, key_id='hmac', algorithm='hmac-sha256', headers=('date', 'digest')):
+        hs = HeaderSigner(key_id=key_id, secret=self.secret, algorithm=algorithm, headers=list(headers))
+        return dict(hs.sign(self.headers))
+
+    def assertRejected(self, stage, headers):
+        with self.assertRaises(RequestRejected) as ex:
+            self.engine.verify(headers)
+        self.assertEqual(ex.exception.stage, stage)
+        self.assertEqual(self.keystore.parsed, [])
+
+    def test_accepts(self):
+        self.assertTrue(self.engine.verify(self.sign()))
+        self.assertEqual(self.keystore.parsed, ['hmac'])
+
+    def test_syntax(self):
+        self.assertRejected('syntax', self.headers)
+        self.assertRejected('syntax', dict(self.headers, Authorization='Signature'))
+        self.assertRejected('syntax', dict(self.headers, Authorization='Signature keyId="hmac",algorithm="hmac-sha256"'))
+        self.assertRejected('syntax', dict(self.headers, Authorization='Signature keyId="hmac" junk'))
+
+    def test_algorithm(self):
+        # checked before the (unknown) keyId
+        self.assertRejected('algorithm', self.sign(key_id='unknown', algorithm='hmac-sha1'))
+
+    def test_key_id(self):
+        self.assertRejected('key_id', self.sign(key_id='unknown', headers=('date',)))
+
+    def test_headers(self):
+        self.assertRejected('headers', self.sign(headers=('date',)))
+        signed = self.sign()
+        del signed['digest']
+        self.assertRejected('headers', signed)
+
+    def test_clock_skew(self):
+        signed = self.sign()
+        self.now += 61
+        self.assertRejected('clock_skew', signed)
+
+    def test_host(self):
+        prevalidator = PreValidator(required_headers=['host'])
+        hs = HeaderSigner(key_id='hmac', secret=self.secret, algorithm='hmac-sha256', headers=['host'])
+        signed = dict(hs.sign({}, host='example.com'))
+        with self.assertRaises(RequestRejected):
+            prevalidator.check(signed)
+        self.assertEqual(prevalidator.check(signed, host='example.com').key_id, 'hmac')
+
+    def test_header_verifier(self):
+        # rejected before the key (not even a valid one) is parsed
+        prevalidator = PreValidator(algorithms=['hmac-sha256'])
+        signed = dict(self.headers, Authorization='Signature keyId="rsa",algorithm="rsa-sha256",signature="abc"')
+        with self.assertRaises(RequestRejected) as ex:
+            HeaderVerifier(signed, secret='not a key', prevalidator=prevalidator)
+        self.assertEqual(ex.exception.stage, 'algorithm')
+        hv = HeaderVerifier(self.sign(), secret=self.secret, prevalidator=prevalidator)
+        self.assertTrue(hv.verify())
+
+
+if __name__ == '__main__':
+    unittest.main()
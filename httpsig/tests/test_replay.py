@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import unittest
+
+from httpsig.sign import HeaderSigner
+from httpsig.verify import HeaderVerifier, SignatureVerifier
+from httpsig.keystore import KeyStore
+from httpsig.replay import ReplayGuard, LocalReplayStore
+from httpsig.utils import parse_http_date, HttpSigException
+
+
+class TestLocalReplayStore(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.store = LocalReplayStore(bucket_seconds=10, max_entries=100, clock=lambda: self.now)
+
+    def test_add(self):
+        self.assertTrue(self.store.add('a', 1100))
+        self.assertFalse(self.store.add('a', 1100))
+        self.assertTrue(self.store.add('b', 1100))
+        self.assertEqual(len(self.store), 2)
+
+    def test_expire_buckets(self):
+        self.store.add('a', 1005)
+        self.store.add('b', 1015)
+        self.store.add('c', 1025)
+        self.now = 1020
+        self.store.add('d', 1100)
+        self.assertEqual(len(self.store), 2)
+        # expired keys can no longer be recorded
+        self.assertFalse(self.store.add('e', 1005))
+
+    def test_bounded(self):
+        for i in range(300):
+            self.store.add(str(i), 1000 + i)
+        self.assertLessEqual(len(self.store), 100)
+        # keys older than what the store still tracks are refused rather than forgotten
+        self.assertFalse(self.store.add('0', 1000))
+        self.assertFalse(self.store.add('299', 1299))
+
+
+class TestReplayGuard(unittest.TestCase):
+    def setUp(self):
+        self.secret = "something special goes here"
+        self.date = 'Thu, 05 Jan 2012 21:31:40 GMT'
+        self.now = parse_http_date(self.date) + 10
+
+        self.keystore = KeyStore({'Test': self.secret})
+        self.guard = ReplayGuard(max_skew=60, clock=lambda: self.now)
+        self.engine = SignatureVerifier(self.keystore, replay_guard=self.guard)
+        self.signer = HeaderSigner(key_id='Test', secret=self.secret, algorithm='hmac-sha256')
+
+    def test_replay(self):
+        signed = self.signer.sign({'Date': self.date})
+        self.assertTrue(self.engine.verify(signed))
+        with self.assertRaises(HttpSigException) as ex:
+            self.engine.verify(signed)
+        self.assertEqual(str(ex.exception), "Replayed signature.")
+
+    def test_failures_not_recorded(self):
+        signed = self.signer.sign({'Date': self.date})
+        forged = dict(signed)
+        forged['date'] = 'Thu, 05 Jan 2012 21:31:41 GMT'
+        self.assertFalse(self.engine.verify(forged))
+        self.assertTrue(self.engine.verify(signed))
+
+    def test_skew(self):
+        signed = self.signer.sign({'Date': self.date})
+        self.now += 100
+        with self.assertRaises(HttpSigException) as ex:
+            self.engine.verify(signed)
+        self.assertEqual(str(ex.exception), "Request date outside the allowed clock skew.")
+
+    def test_injected_created(self):
+        # a stale request cannot be refreshed with a 'created' parameter the signature does not cover
+        signed = self.signer.sign({'Date': self.date})
+        self.now += 3600
+        signed['Authorization'] += ',created=%d' % int(self.now)
+        with self.assertRaises(HttpSigException) as ex:
+            self.engine.verify(signed)
+        self.assertEqual(str(ex.exception), "Request date outside the allowed clock skew.")
+
+    def test_unsigned_date(self):
+        engine = SignatureVerifier(self.keystore, required_headers=['x-request-id'], replay_guard=self.guard)
+        signer = HeaderSigner(key_id='Test', secret=self.secret, algorithm='hmac-sha256', headers=['x-request-id'])
+        signed = signer.sign({'Date': self.date, 'X-Request-Id': '1'})
+        with self.assertRaises(HttpSigException) as ex:
+            engine.verify(signed)
+        self.assertEqual(str(ex.exception), "Missing or invalid request date.")
+
+    def test_missing_date(self):
+        signed = self.signer.sign({'Date': 'not a date'})
+        with self.assertRaises(HttpSigException):
+            self.engine.verify(signed)
+
+    def test_header_verifier(self):
+        signed = self.signer.sign({'Date': self.date})
+        self.assertTrue(HeaderVerifier(signed, secret=self.secret, replay_guard=self.guard).verify())
+        with self.assertRaises(HttpSigException):
+            HeaderVerifier(signed, secret=self.secret, replay_guard=self.guard).verify()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import threading
+import unittest
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+
+try:
+    import requests
+    from httpsig.requests_auth import HTTPSignatureAuth, SignedSession
+except ImportError:
+    requests = None
+
+from httpsig.keystore import KeyStore
+from httpsig.sign import HeaderSigner
+from httpsig.verify import HeaderVerifier, SignatureVerifier
+from httpsig.utils import parse_signature_params, HttpSigException
+
+
+@unittest.skipIf(requests is None, "requests is required")
+class TestHTTPSignatureAuth(unittest.TestCase):
+    secret = 'something special goes here'
+    headers = ['(request-line)', 'host', 'date']
+    date = 'Thu, 05 Jan 2012 21:31:40 GMT'
+
+    def prepare(self, auth, url, method='GET'):
+        return requests.Request(method, url, auth=auth, headers={'Date': self.date}).prepare()
+
+    def test_matches_sign(self):
+        auth = HTTPSignatureAuth(key_id='Test', secret=self.secret, headers=self.headers)
+        r = self.prepare(auth, 'https://example.com:8443/foo/bar?param=value&pet=dog#top', 'POST')
+
+        expected = HeaderSigner(key_id='Test', secret=self.secret, algorithm='hmac-sha256',
+                                headers=self.headers).sign({'Date': self.date}, host='example.com:8443',
+                                                           method='POST', path='/foo/bar?param=value&pet=dog')
+        self.assertEqual(r.headers['Authorization'], expected['Authorization'])
+        hv = HeaderVerifier(dict(r.headers), self.secret, required_headers=self.headers,
+                            method='POST', path=r.path_url, host='example.com:8443')
+        self.assertTrue(hv.verify())
+
+    def test_in_place(self):
+        auth = HTTPSignatureAuth(key_id='Test', secret=self.secret, headers=self.headers)
+        r = requests.Request('GET', 'http://example.com', headers={'Date': self.date}).prepare()
+        headers = r.headers
+        auth(r)
+        self.assertIs(r.headers, headers)
+        self.assertEqual(sorted(k.lower() for k in r.headers), ['authorization', 'date'])
+
+    def test_netloc_cache(self):
+        auth = HTTPSignatureAuth(key_id='Test', secret=self.secret, headers=self.headers)
+        self.assertEqual(auth._split_url('http://example.com/')[::2], ('example.com', '/'))
+        self.assertEqual(auth._split_url('http://example.com/a?b=c')[::2], ('example.com', '/a?b=c'))
+        self.assertEqual(auth._split_url('http://user@example.com:80')[::2], ('user@example.com:80', '/'))
+        self.assertEqual(sorted(auth._hosts.keys()), ['http://example.com', 'http://user@example.com:80'])
+
+
+class ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class VerifyingHandler(BaseHTTPRequestHandler):
+    """Answers 200 with the keyId to requests whose signature verifies, 401 to the others."""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        headers = dict(self.headers.items())
+        try:
+            ok = self.server.engine.verify(headers, method='GET', path=self.path)
+        except HttpSigException:
+            ok = False
+        body = parse_signature_params(headers['authorization']).key_id if ok else ''
+        self.send_response(200 if ok else 401)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@unittest.skipIf(requests is None, "requests is required")
+class TestSignedSession(unittest.TestCase):
+    headers = ['(request-line)', 'host', 'date']
+
+    def setUp(self):
+        keystore = KeyStore({'one': 'first secret', 'two': 'second secret'})
+        self.server = ThreadingServer(('127.0.0.1', 0), VerifyingHandler)
+        self.server.engine = SignatureVerifier(keystore, required_headers=self.headers)
+        self.url = 'http://127.0.0.1:%d' % self.server.server_address[1]
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def session(self):
+        session = SignedSession('one', 'first secret', headers=self.headers, pool_maxsize=8)
+        session.headers['Date'] = 'Thu, 05 Jan 2012 21:31:40 GMT'
+        return session
+
+    def test_keys(self):
+        session = self.session()
+        session.add_key('two', 'second secret', headers=self.headers)
+        self.assertEqual(session.get(self.url + '/a?b=c').text, 'one')
+        self.assertEqual(session.get(self.url + '/', key_id='two').text, 'two')
+        with self.assertRaises(HttpSigException):
+            session.get(self.url, key_id='three')
+        # the positional arguments of Session.request are kept
+        self.assertEqual(session.request('GET', self.url + '/a', {'b': 'c'}).text, 'one')
+        self.assertEqual(session.request('GET', self.url + '/a', {'b': 'c'}, key_id='two').text, 'two')
+
+    def test_threads(self):
+        session = self.session()
+        results = []
+
+        def worker(n):
+            for i in range(10):
+                results.append(session.get('%s/%d/%d' % (self.url, n, i)).status_code)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [200] * 80)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -74,3 +74,68 @@ class TestSign(unittest.TestCase):
         self.assertEqual(params['algorithm'], 'rsa-sha256')
         self.assertEqual(params['headers'], '(request-line) host date content-type content-md5 content-length')
         self.assertEqual(params['signature'], 'vYJio4AxbN38TKdzE1Qk/3qXhzTaBS7zUIPCqV+NsjLSf8ZK/19L9ErTz8FYBAW8Gko2dEaU70McrIO33k0PUlPsWvbGn/IhnU14rvSPF/F+AnFVFeA9ivvvyVZQYYYp17fnNfiCzHrvUn+VnqMhRKA15Nr8KKwt9Eqi36wQ8Vg=')
+
+    def test_sign_many(self):
+        hs = HeaderSigner(key_id='Test', secret=self.key, headers=[
+            '(request-line)',
+            'host',
+            'date',
+            'content-type',
+            'content-md5',
+            'content-length'
+        ])
+        requests = []
+        for i in range(3):
+            requests.append(({
+                'host': 'example.com',
+                'Date': 'Thu, 05 Jan 2012 21:31:40 GMT',
+                'CONTENT-TYPE': 'application/json',
+                'Content-MD5': 'Sd/dVLAcvNLSq16eXua5uQ==',
+                'Content-Length': '18',
+            }, None, 'POST', '/foo?param=value&pet=dog'))
+        signed = list(hs.sign_many(requests))
+        self.assertEqual(len(signed), 3)
+        for (unsigned, _, method, path), headers in zip(requests, signed):
+            self.assertIs(unsigned, headers)
+            expected = hs.sign(dict(unsigned), method=method, path=path)
+            self.assertEqual(headers['Authorization'], expected['Authorization'])
+
+    def test_sign_many_default(self):
+        hs = HeaderSigner(key_id='Test', secret=self.key)
+        unsigned = {
+            'Date': 'Thu, 05 Jan 2012 21:31:40 GMT'
+        }
+        signed, = hs.sign_many([unsigned])
+        params = self._parse_auth(signed['Authorization'])
+        self.assertEqual(params['signature'], 'ATp0r26dbMIxOopqw0OfABDT7CKMIoENumuruOtarj8n/97Q3htHFYpH8yOSQk3Z5zh8UxUym6FYTb5+A0Nz3NRsXJibnYi7brE/4tx5But9kkFGzG+xpUmimN4c3TMN7OFH//+r8hBf7BT9/GmHDUVZT2JzWGLZES2xDOUuMtA=')
+
+    def test_sign_many_missing_header(self):
+        hs = HeaderSigner(key_id='Test', secret=self.key, headers=['date', 'content-type'])
+        with self.assertRaises(Exception) as ex:
+            list(hs.sign_many([{'Date': 'Thu, 05 Jan 2012 21:31:40 GMT'}]))
+        self.assertEqual(ex.exception.message, 'missing required header "content-type"')
+
+    def test_sign_raw(self):
+        hs = HeaderSigner(key_id='Test', secret=self.key, headers=[
+            '(request-line)',
+            'host',
+            'date',
+            'content-type',
+        ])
+        raw_headers = [
+            (b'host', b'example.com'),
+            (b'date', b'Thu, 05 Jan 2012 21:31:40 GMT'),
+            (b'Content-Type', b'application/json'),
+            (b'cookie', b'session=abc'),
+        ]
+        auth = hs.sign_raw(raw_headers, method=b'POST', path=b'/foo?param=value&pet=dog')
+        self.assertIsInstance(auth, bytes)
+        self.assertEqual(len(raw_headers), 4)
+        expected = hs.sign(dict(raw_headers), method='POST', path='/foo?param=value&pet=dog')
+        self.assertEqual(auth, expected['Authorization'])
+
+    def test_sign_raw_missing_header(self):
+        hs = HeaderSigner(key_id='Test', secret=self.key, headers=['date', 'content-type'])
+        with self.assertRaises(Exception) as ex:
+            hs.sign_raw([(b'date', b'Thu, 05 Jan 2012 21:31:40 GMT')])
+        self.assertEqual(ex.exception.message, 'missing required header "content-type"')
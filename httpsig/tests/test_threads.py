@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import threading
+import unittest
+
+from httpsig.backends import available_backends
+from httpsig.keystore import KeyStore
+from httpsig.sign import HeaderSigner, Signer
+from httpsig.verify import HeaderVerifier, Verifier
+
+
+class TestThreads(unittest.TestCase):
+    """Shared signers and verifiers used from 64 threads at once must give the single-threaded results."""
+    threads = 64
+
+    def setUp(self):
+        self.private_key = open(os.path.join(os.path.dirname(__file__), 'rsa_private.pem'), 'r').read()
+        self.public_key = open(os.path.join(os.path.dirname(__file__), 'rsa_public.pem'), 'r').read()
+        self.messages = ['message %d' % i for i in range(20)]
+
+    def stress(self, work):
+        errors = []
+        start = threading.Event()
+
+        def run(n):
+            start.wait()
+            try:
+                work(n)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run, args=(n,)) for n in range(self.threads)]
+        for thread in threads:
+            thread.start()
+        start.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def check_signer(self, secret, public, algorithm, backend, rounds=1, count=20):
+        signer = Signer(secret, algorithm, backend=backend)
+        verifier = Verifier(public, algorithm, backend=backend)
+        messages = self.messages[:count]
+        expected = [signer._sign(m) for m in messages]
+
+        def work(n):
+            for _ in range(rounds):
+                for i, m in enumerate(messages):
+                    signature = signer._sign(m)
+                    if algorithm.startswith('hmac'):
+                        assert signature == expected[i], (n, i)
+                    assert verifier._verify(m, signature), (n, i)
+                    assert not verifier._verify(m + '!', signature), (n, i)
+
+        self.stress(work)
+
+    def test_hmac(self):
+        for backend in available_backends():
+            for algorithm in ('hmac-sha1', 'hmac-sha256', 'hmac-sha512'):
+                self.check_signer('secret', 'secret', algorithm, backend, rounds=5)
+
+    def test_rsa(self):
+        for backend in available_backends():
+            self.check_signer(self.private_key, self.public_key, 'rsa-sha256', backend, count=3)
+
+    def test_header_signer_keystore(self):
+        hs = HeaderSigner(key_id='Test', secret='secret', algorithm='hmac-sha256',
+                          headers=['(request-line)', 'date'])
+        keystore = KeyStore({'Test': 'secret'})
+
+        def work(n):
+            for i in range(20):
+                headers = hs.sign({'Date': 'Thu, 05 Jan 2012 21:31:40 GMT'}, method='GET', path='/%d/%d' % (n, i))
+                assert HeaderVerifier(headers, required_headers=['date'], method='GET', path='/%d/%d' % (n, i),
+                                      keystore=keystore).verify(), (n, i)
+                assert not HeaderVerifier(headers, method='GET', path='/other', keystore=keystore).verify(), (n, i)
+
+        self.stress(work)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,7 +6,8 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
 import unittest
 
-from httpsig.utils import get_fingerprint
+from httpsig import utils
+from httpsig.utils import constant_time_compare, get_algorithm, get_fingerprint, LRUCache, parse_signature_params, parse_authorization, SigningStringTemplate, HeaderView, HttpSigException
 
 class TestUtils(unittest.TestCase):
 
@@ -15,3 +16,148 @@ class TestUtils(unittest.TestCase):
             key = k.read()
         fingerprint = get_fingerprint(key)
         self.assertEqual(fingerprint, "73:61:a2:21:67:e0:df:be:7e:4b:93:1e:15:98:a5:b7")
+
+    def test_constant_time_compare(self):
+        compare_digest = utils._compare_digest
+        try:
+            for utils._compare_digest in (compare_digest, None):
+                self.assertTrue(constant_time_compare('abc', 'abc'))
+                self.assertFalse(constant_time_compare('abc', 'abd'))
+                self.assertFalse(constant_time_compare('abc', 'ab'))
+        finally:
+            utils._compare_digest = compare_digest
+
+    def test_get_algorithm(self):
+        self.assertEqual(get_algorithm('rsa-sha256'), ('rsa', 'sha256'))
+        self.assertEqual(get_algorithm('rsa-pss-sha512'), ('rsa-pss', 'sha512'))
+        self.assertEqual(get_algorithm('ed25519'), ('ed25519', None))
+        with self.assertRaises(HttpSigException):
+            get_algorithm('rsa-md5')
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        self.cache = LRUCache(maxsize=2, ttl=10, clock=lambda: self.now)
+
+    def test_evicts_least_recently_used(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.assertEqual(self.cache.get('a'), 1)
+        self.cache.set('c', 3)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertEqual(self.cache.get('c'), 3)
+
+    def test_ttl(self):
+        self.cache.set('a', 1)
+        self.now += 9
+        self.assertEqual(self.cache.get('a'), 1)
+        self.now += 1
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(len(self.cache), 0)
+
+
+class TestParseSignatureParams(unittest.TestCase):
+
+    def test_basic(self):
+        params = parse_signature_params('Signature keyId="Test",algorithm="rsa-sha256",'
+                                        'headers="(request-line) host date",signature="abc+/="')
+        self.assertEqual(params.key_id, 'Test')
+        self.assertEqual(params.algorithm, 'rsa-sha256')
+        self.assertEqual(params.headers, ('(request-line)', 'host', 'date'))
+        self.assertEqual(params.signature, 'abc+/=')
+        self.assertIsNone(params.extra)
+
+    def test_quoted_commas_and_escapes(self):
+        params = parse_signature_params(r'Signature keyId="a,b=\"c\\d",algorithm=hmac-sha256, signature="x"')
+        self.assertEqual(params.key_id, r'a,b="c\d')
+        self.assertEqual(params.algorithm, 'hmac-sha256')
+        self.assertEqual(params.signature, 'x')
+        self.assertIsNone(params.headers)
+
+    def test_extra(self):
+        auth = 'Signature keyId="Test",created="1402170695",signature="x"'
+        self.assertEqual(parse_authorization(auth),
+                         {'keyId': 'Test', 'created': '1402170695', 'signature': 'x'})
+
+    def test_memoized(self):
+        auth = 'Signature keyId="Test",algorithm="hmac-sha1",signature="x"'
+        self.assertIs(parse_signature_params(auth), parse_signature_params(auth))
+
+    def test_malformed(self):
+        for auth in ('Signature', 'Signature keyId="Test" signature="x"', 'Signature keyId="Test'):
+            with self.assertRaises(HttpSigException):
+                parse_signature_params(auth)
+
+
+class TestSigningStringTemplate(unittest.TestCase):
+
+    def setUp(self):
+        self.headers = {
+            'Host': 'example.com',
+            'date': 'Thu, 05 Jan 2012 21:31:40 GMT',
+            'CONTENT-TYPE': 'application/json',
+        }
+
+    def test_render(self):
+        template = SigningStringTemplate(['(request-line)', 'Host', 'date', 'content-type'])
+        self.assertEqual(template.headers, ('(request-line)', 'host', 'date', 'content-type'))
+        self.assertEqual(template.render(self.headers, method='POST', path='/foo'),
+                         '(request-line): post /foo\n'
+                         'host: example.com\n'
+                         'date: Thu, 05 Jan 2012 21:31:40 GMT\n'
+                         'content-type: application/json')
+        self.assertEqual(template.render(self.headers, host='other.com', method='GET', path='/').split('\n')[1],
+                         'host: other.com')
+
+    def test_with_host(self):
+        template = SigningStringTemplate(['date', 'host']).with_host('other.com')
+        self.assertEqual(template.render(self.headers), 'date: Thu, 05 Jan 2012 21:31:40 GMT\nhost: other.com')
+        self.assertEqual(bytes(template.render_raw([(b'date', b'now')])), b'date: now\nhost: other.com')
+
+    def test_default(self):
+        self.assertEqual(SigningStringTemplate().render(self.headers), 'date: Thu, 05 Jan 2012 21:31:40 GMT')
+
+    def test_compile_cached(self):
+        self.assertIs(SigningStringTemplate.compile(['date', 'host']), SigningStringTemplate.compile(['date', 'host']))
+
+    def test_errors(self):
+        with self.assertRaises(Exception) as ex:
+            SigningStringTemplate(['digest']).render(self.headers)
+        self.assertEqual(ex.exception.message, 'missing required header "digest"')
+        with self.assertRaises(Exception) as ex:
+            SigningStringTemplate(['(request-line)']).render(self.headers)
+        self.assertEqual(ex.exception.message, 'method and path arguments required when using "(request-line)"')
+
+
+class TestHeaderView(unittest.TestCase):
+
+    def test_dict(self):
+        headers = {'Content-Type': 'application/json', 'x-lower': 'a', 'X-ODD-case': 'b'}
+        view = HeaderView(headers)
+        self.assertEqual(view['content-type'], 'application/json')
+        self.assertEqual(view['X-Lower'], 'a')
+        self.assertEqual(view['x-odd-case'], 'b')
+        self.assertIn('CONTENT-TYPE', view)
+        self.assertNotIn('date', view)
+        self.assertIsNone(view.get('date'))
+        with self.assertRaises(KeyError):
+            view['date']
+        self.assertEqual(len(view), 3)
+        self.assertEqual(sorted(view), sorted(headers))
+
+    def test_pairs(self):
+        view = HeaderView([('content-type', 'application/json'), ('X-Odd', 'b')])
+        self.assertEqual(view['Content-Type'], 'application/json')
+        self.assertEqual(view['x-odd'], 'b')
+        self.assertEqual(list(view), ['content-type', 'X-Odd'])
+
+    def test_no_copy(self):
+        headers = {'Date': 'Thu, 05 Jan 2012 21:31:40 GMT'}
+        view = HeaderView(HeaderView(headers))
+        headers['Digest'] = 'SHA-256=abc'
+        self.assertEqual(view['digest'], 'SHA-256=abc')
+        self.assertEqual(SigningStringTemplate(['date', 'digest']).render(view),
+                         'date: Thu, 05 Jan 2012 21:31:40 GMT\ndigest: SHA-256=abc')
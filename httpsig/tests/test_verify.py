@@ -7,7 +7,9 @@ import json
 import unittest
 
 from httpsig.sign import HeaderSigner, Signer
-from httpsig.verify import HeaderVerifier, Verifier
+from httpsig.verify import HeaderVerifier, Verifier, SignatureVerifier, verify_many
+from httpsig.keystore import KeyStore
+from httpsig.utils import HttpSigException
 
 class BaseTestCase(unittest.TestCase):
     def _parse_auth(self, auth):
@@ -55,6 +57,13 @@ class TestVerifyHMACSHA1(BaseTestCase):
         hv = HeaderVerifier(headers=signed, secret=self.verify_secret)
         self.assertTrue(hv.verify())
 
+    def test_sign_raw(self):
+        raw_headers = [(b'date', b'Thu, 05 Jan 2012 21:31:40 GMT')]
+        hs = HeaderSigner(key_id="Test", secret=self.sign_secret, algorithm=self.algorithm)
+        signed = dict(raw_headers, authorization=hs.sign_raw(raw_headers))
+        hv = HeaderVerifier(headers=signed, secret=self.verify_secret)
+        self.assertTrue(hv.verify())
+
     def test_signed_headers(self):
         HOST = "example.com"
         METHOD = "POST"
@@ -79,6 +88,15 @@ class TestVerifyHMACSHA1(BaseTestCase):
         hv = HeaderVerifier(headers=signed, secret=self.verify_secret, host=HOST, method=METHOD, path=PATH)
         self.assertTrue(hv.verify())
 
+    def test_plain_dict(self):
+        unsigned = {
+            'Date': 'Thu, 05 Jan 2012 21:31:40 GMT'
+        }
+        hs = HeaderSigner(key_id="Test", secret=self.sign_secret, algorithm=self.algorithm)
+        signed = dict(unsigned, Authorization=hs.authorization(unsigned))
+        hv = HeaderVerifier(headers=signed, secret=self.verify_secret)
+        self.assertTrue(hv.verify())
+
     def test_incorrect_headers(self):
         HOST = "example.com"
         METHOD = "POST"
@@ -136,6 +154,29 @@ class TestVerifyHMACSHA256(TestVerifyHMACSHA1):
         super(TestVerifyHMACSHA256, self).setUp()
         self.algorithm = "hmac-sha256"
 
+    def test_malformed_signature(self):
+        verifier = Verifier(secret=self.verify_secret, algorithm=self.algorithm)
+        signature = Signer(secret=self.sign_secret, algorithm=self.algorithm)._sign("this is a test")
+        self.assertTrue(verifier._verify("this is a test", unicode(signature)))
+
+        class CountingKey(object):
+            def __init__(self, key):
+                self.key = key
+                self.encoded_size = key.encoded_size
+                self.calls = 0
+
+            def verify(self, data, mac):
+                self.calls += 1
+                return self.key.verify(data, mac)
+
+        verifier._hash = CountingKey(verifier._hash)
+        for junk in (None, '', signature[:-4], signature + 'AAAA', 'x' * 1000):
+            self.assertFalse(verifier._verify("this is a test", junk))
+        # wrong sizes never reach the hash
+        self.assertEqual(verifier._hash.calls, 0)
+        for junk in ('!' * len(signature), signature[:-2] + '=A', u'\xe9' * len(signature)):
+            self.assertFalse(verifier._verify("this is a test", junk))
+
 class TestVerifyHMACSHA512(TestVerifyHMACSHA1):
     def setUp(self):
         super(TestVerifyHMACSHA512, self).setUp()
@@ -164,3 +205,125 @@ class TestVerifyRSASHA512(TestVerifyRSASHA1):
     def setUp(self):
         super(TestVerifyRSASHA512, self).setUp()
         self.algorithm = "rsa-sha512"
+
+class TestVerifyRSAPSSSHA512(TestVerifyHMACSHA1):
+    def setUp(self):
+        # too small a key for a 64 bytes salt and hash
+        private_key_path = os.path.join(os.path.dirname(__file__), 'rsa2048_private.pem')
+        private_key = open(private_key_path, 'r').read()
+
+        public_key_path = os.path.join(os.path.dirname(__file__), 'rsa2048_public.pem')
+        public_key = open(public_key_path, 'r').read()
+
+        self.keyId = "Test"
+        self.algorithm = "rsa-pss-sha512"
+        self.sign_secret = private_key
+        self.verify_secret = public_key
+
+class TestVerifyECDSASHA256(TestVerifyHMACSHA1):
+    def setUp(self):
+        private_key_path = os.path.join(os.path.dirname(__file__), 'ecdsa_private.pem')
+        private_key = open(private_key_path, 'r').read()
+
+        public_key_path = os.path.join(os.path.dirname(__file__), 'ecdsa_public.pem')
+        public_key = open(public_key_path, 'r').read()
+
+        self.keyId = "Test"
+        self.algorithm = "ecdsa-sha256"
+        self.sign_secret = private_key
+        self.verify_secret = public_key
+
+class TestVerifyEd25519(TestVerifyHMACSHA1):
+    def setUp(self):
+        private_key_path = os.path.join(os.path.dirname(__file__), 'ed25519_private.pem')
+        private_key = open(private_key_path, 'r').read()
+
+        public_key_path = os.path.join(os.path.dirname(__file__), 'ed25519_public.pem')
+        public_key = open(public_key_path, 'r').read()
+
+        self.keyId = "Test"
+        self.algorithm = "ed25519"
+        self.sign_secret = private_key
+        self.verify_secret = public_key
+
+
+class TestSignatureVerifier(BaseTestCase):
+    def setUp(self):
+        private_key_path = os.path.join(os.path.dirname(__file__), 'rsa_private.pem')
+        self.private_key = open(private_key_path, 'r').read()
+        public_key_path = os.path.join(os.path.dirname(__file__), 'rsa_public.pem')
+        public_key = open(public_key_path, 'r').read()
+
+        self.hmac_secret = "something special goes here"
+        self.keystore = KeyStore({'rsa': public_key, 'hmac': self.hmac_secret})
+        self.engine = SignatureVerifier(self.keystore, required_headers=['(request-line)', 'date'])
+
+        self.HOST = "example.com"
+        self.METHOD = "POST"
+        self.PATH = '/foo?param=value&pet=dog'
+        self.unsigned = {
+            'Host': self.HOST,
+            'Date': 'Thu, 05 Jan 2012 21:31:40 GMT',
+            'Content-Type': 'application/json',
+        }
+        self.headers = ['(request-line)', 'host', 'date', 'content-type']
+
+    def test_reuse(self):
+        rsa = HeaderSigner(key_id='rsa', secret=self.private_key, headers=self.headers)
+        hmac = HeaderSigner(key_id='hmac', secret=self.hmac_secret, algorithm='hmac-sha256', headers=self.headers)
+        for signer in (rsa, hmac, rsa, hmac):
+            signed = signer.sign(self.unsigned, method=self.METHOD, path=self.PATH)
+            self.assertTrue(self.engine.verify(signed, method=self.METHOD, path=self.PATH))
+            self.assertFalse(self.engine.verify(signed, method='GET', path=self.PATH))
+
+    def test_required_headers(self):
+        hs = HeaderSigner(key_id='hmac', secret=self.hmac_secret, algorithm='hmac-sha256')
+        signed = hs.sign(self.unsigned)
+        with self.assertRaises(HttpSigException) as ex:
+            self.engine.verify(signed, method=self.METHOD, path=self.PATH)
+        self.assertEqual(str(ex.exception), "(request-line) is a required header(s)")
+
+    def test_algorithms(self):
+        engine = SignatureVerifier(self.keystore, algorithms=['rsa-sha256'])
+        hs = HeaderSigner(key_id='hmac', secret=self.hmac_secret, algorithm='hmac-sha256')
+        with self.assertRaises(HttpSigException):
+            engine.verify(hs.sign(self.unsigned))
+
+    def test_missing_authorization(self):
+        with self.assertRaises(HttpSigException):
+            self.engine.verify(self.unsigned)
+
+
+class TestVerifyMany(BaseTestCase):
+    def setUp(self):
+        private_key_path = os.path.join(os.path.dirname(__file__), 'rsa_private.pem')
+        private_key = open(private_key_path, 'r').read()
+        public_key_path = os.path.join(os.path.dirname(__file__), 'rsa_public.pem')
+        public_key = open(public_key_path, 'r').read()
+
+        self.keys = {'rsa': public_key}
+        self.signer = HeaderSigner(key_id='rsa', secret=private_key, headers=['(request-line)', 'date'])
+
+    def test_results_in_order(self):
+        requests = []
+        for i in range(10):
+            unsigned = {'Date': 'Thu, 05 Jan 2012 21:31:%02d GMT' % i}
+            signed = self.signer.sign(unsigned, method='GET', path='/%d' % i)
+            if i % 3 == 1:
+                # tampered path
+                requests.append((signed, 'GET', '/other'))
+            elif i % 3 == 2:
+                # no Authorization header
+                requests.append((unsigned, 'GET', '/%d' % i))
+            else:
+                requests.append((signed, 'GET', '/%d' % i))
+
+        results = verify_many(requests, self.keys, max_workers=2, chunksize=3)
+        self.assertEqual(len(results), 10)
+        for i, result in enumerate(results):
+            if i % 3 == 0:
+                self.assertIs(result, True)
+            elif i % 3 == 1:
+                self.assertIs(result, False)
+            else:
+                self.assertIsInstance(result, HttpSigException)
@@ -1,12 +1,30 @@
 import re
+import time
 import struct
+import hmac
 import hashlib
 import base64
+import threading
+from collections import OrderedDict
+from email.utils import parsedate_tz, mktime_tz
 
 from Crypto.PublicKey import RSA
 from Crypto.Hash import SHA, SHA256, SHA512
 
-ALGORITHMS = frozenset(['rsa-sha1', 'rsa-sha256', 'rsa-sha512', 'hmac-sha1', 'hmac-sha256', 'hmac-sha512'])
+# algorithm name -> (signature scheme, hash algorithm); see get_algorithm
+ALGORITHM_REGISTRY = {
+    'rsa-sha1':       ('rsa', 'sha1'),
+    'rsa-sha256':     ('rsa', 'sha256'),
+    'rsa-sha512':     ('rsa', 'sha512'),
+    'rsa-pss-sha512': ('rsa-pss', 'sha512'),
+    'ecdsa-sha256':   ('ecdsa', 'sha256'),
+    'hmac-sha1':      ('hmac', 'sha1'),
+    'hmac-sha256':    ('hmac', 'sha256'),
+    'hmac-sha512':    ('hmac', 'sha512'),
+    # the hash is part of the scheme
+    'ed25519':        ('ed25519', None),
+}
+ALGORITHMS = frozenset(ALGORITHM_REGISTRY)
 HASHES = {'sha1':   SHA,
           'sha256': SHA256,
           'sha512': SHA512}
@@ -14,37 +32,375 @@ HASHES = {'sha1':   SHA,
 class HttpSigException(Exception):
     pass
 
-def generate_message(required_headers, headers, host=None, method=None, path=None):
-    headers = CaseInsensitiveDict(headers)
-    
-    if not required_headers:
-        required_headers = ['date']
-    
-    signable_list = []
-    for h in required_headers:
-        if h == '(request-line)':
-            if not method or not path:
-                raise Exception('method and path arguments required when using "(request-line)"')
-            signable_list.append('%s: %s %s' % (h, method.lower(), path))
-
-        elif h == 'host':
-            # 'host' special case due to requests lib restrictions
-            # 'host' is not available when adding auth so must use a param
-            # if no param used, defaults back to the 'host' header
-            if not host:
-                if 'host' in headers:
-                    host = headers[h]
+def get_algorithm(name):
+    """Return the (signature scheme, hash algorithm) of the algorithm called name."""
+    try:
+        return ALGORITHM_REGISTRY[name]
+    except KeyError:
+        raise HttpSigException("Unknown algorithm.")
+
+_compare_digest = getattr(hmac, 'compare_digest', None)
+
+def constant_time_compare(a, b):
+    """
+    Compare two byte strings in time independent of where they differ.
+    Without hmac.compare_digest (Python < 2.7.7), their SHA-256 digests are compared instead,
+    which reveals nothing about the inputs.
+    """
+    if _compare_digest is not None:
+        return _compare_digest(a, b)
+    return hashlib.sha256(a).digest() == hashlib.sha256(b).digest()
+
+class LRUCache(object):
+    """
+    Small thread-safe LRU mapping with an optional time-to-live.
+
+    maxsize bounds the number of entries; the least recently used one is evicted first.
+    ttl is the lifetime of an entry in seconds, or None to keep entries until evicted.
+    clock is the time source, overridable for tests.
+    """
+    def __init__(self, maxsize=128, ttl=None, clock=time.time):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, expires = self._data.pop(key)
+            except KeyError:
+                return default
+            if expires is not None and expires <= self._clock():
+                return default
+            # re-insert to mark as most recently used
+            self._data[key] = (value, expires)
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Store value under key; ttl overrides the cache's time-to-live for this entry."""
+        if ttl is None:
+            ttl = self.ttl
+        expires = None if ttl is None else self._clock() + ttl
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (value, expires)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def keys(self):
+        with self._lock:
+            return list(self._data.keys())
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+# one auth-param of a Signature header (name=token or name="quoted string") and its separator
+_AUTH_PARAM = re.compile(r'\s*([A-Za-z][A-Za-z0-9_-]*)\s*=\s*(?:"([^"\\]*(?:\\.[^"\\]*)*)"|([^\s,"]*))\s*(?:,|$)')
+_QUOTED_PAIR = re.compile(r'\\(.)')
+
+class SignatureParams(object):
+    """
+    Parsed parameters of a Signature Authorization header.
+
+    headers is the tuple of signed header names, or None when the header did not list any.
+    extra holds any other parameters, or None.
+    Instances are shared between callers and must not be modified.
+    """
+    __slots__ = ('key_id', 'algorithm', 'headers', 'signature', 'extra')
+
+    def __init__(self, key_id=None, algorithm=None, headers=None, signature=None, extra=None):
+        self.key_id = key_id
+        self.algorithm = algorithm
+        self.headers = headers
+        self.signature = signature
+        self.extra = extra
+
+    def as_dict(self):
+        """Return the parameters as a dict keyed by their names in the header."""
+        d = dict(self.extra or ())
+        for name, value in (('keyId', self.key_id), ('algorithm', self.algorithm),
+                            ('signature', self.signature)):
+            if value is not None:
+                d[name] = value
+        if self.headers is not None:
+            d['headers'] = ' '.join(self.headers)
+        return d
+
+def _parse_signature_params(auth):
+    # skip the 'Signature' scheme
+    pos = auth.find(' ') + 1
+    if not pos:
+        raise HttpSigException("Malformed Authorization header.")
+
+    params = SignatureParams()
+    end = len(auth)
+    while pos < end:
+        m = _AUTH_PARAM.match(auth, pos)
+        if m is None:
+            raise HttpSigException("Malformed Authorization header.")
+        pos = m.end()
+        name, quoted, token = m.groups()
+        if quoted is None:
+            value = token
+        elif '\\' in quoted:
+            value = _QUOTED_PAIR.sub(r'\1', quoted)
+        else:
+            value = quoted
+
+        if name == 'keyId':
+            params.key_id = value
+        elif name == 'algorithm':
+            params.algorithm = value
+        elif name == 'signature':
+            params.signature = value
+        elif name == 'headers':
+            params.headers = tuple(value.split())
+        else:
+            if params.extra is None:
+                params.extra = {}
+            params.extra[name] = value
+    return params
+
+_params_cache = LRUCache(maxsize=256)
+
+def parse_signature_params(auth):
+    """
+    Parse a Signature Authorization header into a SignatureParams in a single pass.
+
+    Quoted values may contain commas and backslash escapes. Results are memoized by
+    header string, so replayed requests are not parsed again.
+    Raises HttpSigException if the header is malformed.
+    """
+    params = _params_cache.get(auth)
+    if params is None:
+        params = _parse_signature_params(auth)
+        _params_cache.set(auth, params)
+    return params
+
+def parse_authorization(auth):
+    """Authorization header parsing, returning a dict of the parameters."""
+    return parse_signature_params(auth).as_dict()
+
+# kinds of SigningStringTemplate steps
+_HEADER, _HOST, _REQUEST_LINE, _LITERAL = range(4)
+
+class SigningStringTemplate(object):
+    """
+    Layout of a signing string, compiled once from a list of header names.
+
+    Each step is a (kind, prefix, name, spellings) tuple: the 'name: ' prefix is built
+    at compile time (the whole line for steps pre-rendered by with_host), as are the
+    spellings tried when looking the header up (see find_header), so render() only
+    fetches values and joins them.
+    """
+    _cache = LRUCache(maxsize=64)
+
+    def __init__(self, required_headers=None):
+        names = tuple(h.lower() for h in required_headers or ['date'])
+        steps = []
+        for h in names:
+            if h == '(request-line)':
+                kind = _REQUEST_LINE
+            elif h == 'host':
+                kind = _HOST
+            else:
+                kind = _HEADER
+            steps.append((kind, '%s: ' % h, h, (h, canonical_header(h))))
+        self.headers = names
+        self.steps = tuple(steps)
+        # (kind, separator + prefix, name) as bytes, for render_raw
+        self.raw_steps = tuple((kind, (b'\n' if i else b'') + prefix, h)
+                               for i, (kind, prefix, h, _) in enumerate(steps))
+
+    @classmethod
+    def compile(cls, required_headers=None):
+        """Return the template for a list of header names, reusing a cached one when possible."""
+        key = tuple(required_headers or ())
+        template = cls._cache.get(key)
+        if template is None:
+            template = cls(required_headers)
+            cls._cache.set(key, template)
+        return template
+
+    def with_host(self, host):
+        """
+        Return a copy of this template with the 'host' line pre-rendered for host,
+        for clients sending many requests to the same host.
+        """
+        steps = list(self.steps)
+        raw_steps = list(self.raw_steps)
+        for i, (kind, prefix, h, spellings) in enumerate(steps):
+            if kind is _HOST:
+                steps[i] = (_LITERAL, prefix + host, h, spellings)
+                raw_steps[i] = (_LITERAL, raw_steps[i][1] + host, h)
+        template = object.__new__(type(self))
+        template.headers = self.headers
+        template.steps = tuple(steps)
+        template.raw_steps = tuple(raw_steps)
+        return template
+
+    def render(self, headers, host=None, method=None, path=None):
+        """
+        Build the signing string for a request.
+
+        headers is a dict, HeaderView or list of (name, value) pairs; it is looked up
+        case-insensitively and not copied.
+        host is an override for the 'host' header.
+        method and path are required when using '(request-line)'.
+        """
+        signable_list = []
+        for kind, prefix, h, spellings in self.steps:
+            if kind is _LITERAL:
+                value = ''
+            elif kind is _REQUEST_LINE:
+                if not method or not path:
+                    raise Exception('method and path arguments required when using "(request-line)"')
+                value = '%s %s' % (method.lower(), path)
+            elif kind is _HOST and host:
+                # 'host' special case due to requests lib restrictions
+                # 'host' is not available when adding auth so must use a param
+                # if no param used, defaults back to the 'host' header
+                value = host
+            else:
+                try:
+                    value = find_header(headers, h, spellings)
+                except KeyError:
+                    raise Exception('missing required header "%s"' % (h))
+            signable_list.append(prefix + value)
+        return '\n'.join(signable_list)
+
+    def render_raw(self, raw_headers, host=None, method=None, path=None):
+        """
+        Build the signing string for a request given as raw header pairs, without decoding them.
+
+        raw_headers is a list of (name, value) byte string pairs, as handed over by ASGI servers.
+        host, method and path are byte strings, as for render().
+
+        Returns a bytearray holding the signing string.
+        """
+        buf = bytearray()
+        for kind, prefix, h in self.raw_steps:
+            buf += prefix
+            if kind is _LITERAL:
+                continue
+            if kind is _REQUEST_LINE:
+                if not method or not path:
+                    raise Exception('method and path arguments required when using "(request-line)"')
+                buf += method.lower()
+                buf += b' '
+                buf += path
+            elif kind is _HOST and host:
+                buf += host
+            else:
+                for name, value in raw_headers:
+                    if name == h or name.lower() == h:
+                        buf += value
+                        break
                 else:
                     raise Exception('missing required header "%s"' % (h))
-            signable_list.append('%s: %s' % (h.lower(), host))
-        else:
-            if h not in headers:
-                raise Exception('missing required header "%s"' % (h))
+        return buf
+
+def generate_message(required_headers, headers, host=None, method=None, path=None):
+    return SigningStringTemplate.compile(required_headers).render(headers, host, method, path)
+
+def parse_http_date(value):
+    """Return an HTTP Date header value as a Unix timestamp, or None if it cannot be parsed."""
+    if not value:
+        return None
+    parsed = parsedate_tz(value)
+    if parsed is None:
+        return None
+    try:
+        return mktime_tz(parsed)
+    except (ValueError, OverflowError):
+        return None
+
+def canonical_header(name):
+    """Return the conventional spelling of a lower-case header name, e.g. 'content-type' -> 'Content-Type'."""
+    return '-'.join(part.capitalize() for part in name.split('-'))
+
+def find_header(headers, name, spellings=()):
+    """
+    Case-insensitive lookup of a lower-case header name, without copying the headers.
+
+    headers is a dict, a HeaderView or a list of (name, value) pairs.
+    spellings are the keys of a dict tried first as exact matches (usually the name and
+    its canonical form); only when they all miss are its keys lowercased one by one.
+    """
+    if isinstance(headers, HeaderView):
+        headers = headers._headers
+    if isinstance(headers, list):
+        for key, value in headers:
+            if key == name or key.lower() == name:
+                return value
+        raise KeyError(name)
+    for key in spellings:
+        if key in headers:
+            return headers[key]
+    for key, value in headers.iteritems():
+        if key.lower() == name:
+            return value
+    raise KeyError(name)
+
+class HeaderView(object):
+    """
+    Read-only case-insensitive view of a header dict or of a list of (name, value) pairs.
+
+    Unlike CaseInsensitiveDict nothing is copied: only the keys compared during a lookup
+    are lowercased, so large headers that are never signed are never touched.
+    """
+    __slots__ = ('_headers',)
+
+    def __init__(self, headers):
+        if isinstance(headers, HeaderView):
+            headers = headers._headers
+        self._headers = headers
+
+    def __getitem__(self, key):
+        name = key.lower()
+        return find_header(self._headers, name, (key, name, canonical_header(name)))
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __len__(self):
+        return len(self._headers)
+
+    def __iter__(self):
+        if isinstance(self._headers, list):
+            return (key for key, _ in self._headers)
+        return iter(self._headers)
 
-            signable_list.append('%s: %s' % (h.lower(), headers[h]))
+    def iteritems(self):
+        if isinstance(self._headers, list):
+            return iter(self._headers)
+        return self._headers.iteritems()
 
-    signable = '\n'.join(signable_list)
-    return signable
+    def items(self):
+        return list(self.iteritems())
 
 def lkv(d):
     parts = []
@@ -1,20 +1,20 @@
 """
 Module to assist in verifying a signed header.
 """
-from Crypto.Hash import HMAC
-from Crypto.PublicKey import RSA
-from Crypto.Signature import PKCS1_v1_5
 from base64 import b64decode
+from binascii import a2b_base64, Error as Base64Error
 
+from . import metrics as _metrics
 from .sign import Signer
-from .utils import generate_message, sig, is_rsa, CaseInsensitiveDict, ALGORITHMS, HASHES, HttpSigException
+from .prevalidation import PreValidator
+from .utils import SigningStringTemplate, parse_signature_params, sig, is_rsa, HeaderView, LRUCache, ALGORITHMS, HttpSigException
 
 
 class Verifier(Signer):
     """
     Verifies signed text against a secret.
     For HMAC, the secret is the shared secret.
-    For RSA, the secret is the PUBLIC key.
+    For RSA, ECDSA and Ed25519, the secret is the PUBLIC key.
     """
     def _verify(self, data, signature):
         """
@@ -23,76 +23,275 @@ class Verifier(Signer):
         `signature` is a base64-encoded signature to verify against `data`
         """
         
-        if self.sign_algorithm == 'rsa':
-            # Verify RSA
-            h = self._hash.new()
-            h.update(data)
-            
-            if self._rsa.verify(h, b64decode(signature)):
-                return True
-            else:
-                return False
+        metrics = _metrics.current
+        if metrics is not None:
+            start = _metrics.timer()
+
+        if self._key:
+            # Verify RSA, ECDSA or Ed25519
+            result = self._key.verify(data, b64decode(signature))
         
-        elif self.sign_algorithm == 'hmac':
-            # Verify HMAC
-            h = self._sign_hmac(data)
-            return (h == b64decode(signature))
+        elif self._hash:
+            # Verify HMAC; junk signatures of the wrong size are rejected before any hashing
+            if not signature or len(signature) != self._hash.encoded_size:
+                return False
+            try:
+                mac = a2b_base64(signature)
+            except (Base64Error, ValueError):
+                return False
+            result = self._hash.verify(data, mac)
         
         else:
             # Unknown algo
             raise HttpSigException("Unknown signing algorithm.")
 
+        if metrics is not None:
+            metrics.observe(self._stage, self.algorithm, _metrics.timer() - start)
+        return result
+
 
 class HeaderVerifier(Verifier):
     """
     Verifies an HTTP signature from given headers.
+
+    Either secret or keystore must be given. With a KeyStore, the key is looked up
+    by the keyId of the Authorization header and is not parsed again, and cache may
+    be a VerificationCache bound to that KeyStore.
+    replay_guard is an optional ReplayGuard rejecting stale and reused signatures.
+    prevalidator is an optional PreValidator run before the key is parsed, which raises
+    RequestRejected for requests it turns away.
     """
-    def __init__(self, headers, secret, required_headers=None, method=None, path=None, host=None):
+    def __init__(self, headers, secret=None, required_headers=None, method=None, path=None, host=None, keystore=None,
+                 backend=None, cache=None, replay_guard=None, prevalidator=None):
 
         required_headers = required_headers or ['date']
-        self.auth_dict = self.parse_auth(headers['authorization'])
-        self.headers = CaseInsensitiveDict(headers)
+        self.headers = HeaderView(headers)
         self.required_headers = [s.lower() for s in required_headers]
         self.method = method
         self.path = path
         self.host = host
-        
-        super(HeaderVerifier, self).__init__(secret, algorithm=self.auth_dict['algorithm'])
+        self.cache = cache
+        self.replay_guard = replay_guard
+        self.params = None
+
+        metrics = _metrics.current
+        try:
+            if metrics is not None:
+                start = _metrics.timer()
+            if prevalidator is not None:
+                self.params = prevalidator.check(self.headers, host)
+            else:
+                self.params = parse_signature_params(self.headers['authorization'])
+            if metrics is not None:
+                now = _metrics.timer()
+                metrics.observe('parse', _metrics.algorithm_label(self.params.algorithm), now - start)
+                start = now
+
+            if keystore is not None:
+                self._use_key(keystore.get_verifier(self.params.key_id, self.params.algorithm))
+            else:
+                super(HeaderVerifier, self).__init__(secret, algorithm=self.params.algorithm, backend=backend)
+            if metrics is not None:
+                metrics.observe('key_lookup', self.params.algorithm, _metrics.timer() - start)
+        except Exception as e:
+            if metrics is not None:
+                metrics.verified(_metrics.algorithm_label(self.params and self.params.algorithm),
+                                 _metrics.failure_reason(e))
+            raise
+
+    @property
+    def auth_dict(self):
+        return self.params.as_dict()
 
     def parse_auth(self, auth):
-        """
-        Basic Authorization header parsing.
-        FIXME: Fails if there is a comma inside a quoted string.
-        """
-        # split 'Signature kvpairs'
-        s, param_str = auth.split(' ', 1)
-        
-        # split k1="v1",k2="v2",...
-        param_list = param_str.split(',')
-        
-        # convert into [(k1,"v1"), (k2, "v2"), ...]
-        param_pairs = [p.split('=', 1) for p in param_list]
-        
-        # convert into {k1:v1, k2:v2, ...}
-        param_dict = {k: v.strip('"') for k, v in param_pairs}
-        
-        return param_dict
+        """Authorization header parsing, returning a dict of the parameters."""
+        return parse_signature_params(auth).as_dict()
 
     def get_signable(self):
         """Get the string that is signed"""
-        header_dict = self.parse_auth(self.headers['authorization'])
-        if self.auth_dict.get('headers'):
-            auth_headers = self.auth_dict.get('headers').split(' ')
-        else:
-            auth_headers = ['date']
+        auth_headers = self.params.headers or ['date']
         
         if len(set(self.required_headers) - set(auth_headers)) > 0:
             raise Exception('{} is a required header(s)'.format(', '.join(set(self.required_headers)-set(auth_headers))))
         
-        signable = generate_message(auth_headers, self.headers, self.host, self.method, self.path)
+        template = SigningStringTemplate.compile(auth_headers)
+        signable = template.render(self.headers, self.host, self.method, self.path)
 
         return signable
 
     def verify(self):
-        signing_str = self.get_signable()
-        return self._verify(signing_str, self.auth_dict['signature'])
+        metrics = _metrics.current
+        try:
+            if metrics is not None:
+                start = _metrics.timer()
+            signing_str = self.get_signable()
+            if metrics is not None:
+                metrics.observe('signing_string', self.params.algorithm, _metrics.timer() - start)
+            if self.replay_guard is not None:
+                timestamp = self.replay_guard.check_fresh(self.params, self.headers)
+            if self.cache is not None:
+                result = self.cache.check(self.params, signing_str, self.headers.get('date'),
+                                          lambda params, signable: self._verify(signable, params.signature))
+            else:
+                result = self._verify(signing_str, self.params.signature)
+            if result and self.replay_guard is not None:
+                self.replay_guard.mark_used(self.params, timestamp)
+        except Exception as e:
+            if metrics is not None:
+                metrics.verified(self.params.algorithm, _metrics.failure_reason(e))
+            raise
+        if metrics is not None:
+            metrics.verified(self.params.algorithm, None if result else 'bad_signature')
+        return result
+
+
+class SignatureVerifier(object):
+    """
+    Long-lived verification engine, built once and shared by every request and thread.
+
+    Unlike HeaderVerifier it holds only the verification policy; verify() keeps no
+    per-request state on the instance.
+
+    keystore is the KeyStore used to resolve the keyId of each request.
+    required_headers is a list of headers every signature must cover, defaulting to ['date'].
+    algorithms is the collection of accepted algorithms, defaulting to all of them.
+    cache is an optional VerificationCache bound to keystore.
+    replay_guard is an optional ReplayGuard rejecting stale and reused signatures.
+    """
+    def __init__(self, keystore, required_headers=None, algorithms=None, cache=None, replay_guard=None):
+        self.keystore = keystore
+        self.cache = cache
+        self.replay_guard = replay_guard
+        self.prevalidator = PreValidator(keystore, required_headers, algorithms, replay_guard)
+        self.required_headers = self.prevalidator.required_headers
+        self.algorithms = self.prevalidator.algorithms
+
+    def verify(self, headers, method=None, path=None, host=None):
+        """
+        Verify the signature in the Authorization header of a request.
+
+        headers is a dict of the request headers, including 'Authorization'.
+        method, path and host are as for HeaderVerifier.
+
+        Returns True or False depending on the signature; raises HttpSigException
+        when the request does not satisfy the policy (RequestRejected, naming the
+        PreValidator stage, when that is found before any cryptography).
+        """
+        headers = HeaderView(headers)
+        metrics = _metrics.current
+        if metrics is None:
+            params, signable = self._prepare(headers, method, path, host)
+            return self._check_request(params, signable, headers)
+
+        try:
+            params, signable = self._prepare(headers, method, path, host)
+            result = self._check_request(params, signable, headers)
+        except Exception as e:
+            metrics.verified(_request_algorithm(headers), _metrics.failure_reason(e))
+            raise
+        metrics.verified(params.algorithm, None if result else 'bad_signature')
+        return result
+
+    def _prepare(self, headers, method, path, host, check_key=True):
+        """
+        Apply the policy to a request through the PreValidator and build its signing string,
+        without touching any key.
+        Returns the SignatureParams of the request and its signing string.
+        """
+        prevalidator = self.prevalidator
+        metrics = _metrics.current
+        if metrics is not None:
+            start = _metrics.timer()
+        params, template = prevalidator._check_params(headers, check_key)
+        if metrics is not None:
+            now = _metrics.timer()
+            metrics.observe('parse', params.algorithm, now - start)
+            start = now
+        # the 'headers' stage, looking each header up once
+        signable = prevalidator._render(template, headers, host, method, path)
+        if metrics is not None:
+            metrics.observe('signing_string', params.algorithm, _metrics.timer() - start)
+        prevalidator._check_fresh(params, headers)
+        return params, signable
+
+    def _check(self, params, signable):
+        """Check the signature of a prepared request against its key."""
+        metrics = _metrics.current
+        if metrics is not None:
+            start = _metrics.timer()
+        verifier = self.keystore.get_verifier(params.key_id, params.algorithm)
+        if metrics is not None:
+            metrics.observe('key_lookup', params.algorithm, _metrics.timer() - start)
+        return verifier._verify(signable, params.signature or '')
+
+    def _check_request(self, params, signable, headers):
+        """_check, going through the VerificationCache and the ReplayGuard if there are any."""
+        if self.cache is None:
+            result = self._check(params, signable)
+        else:
+            result = self.cache.check(params, signable, headers.get('date'), self._check)
+        if result and self.replay_guard is not None:
+            self.replay_guard.mark_used(params, self.replay_guard.request_time(params, headers))
+        return result
+
+def _request_algorithm(headers):
+    """The algorithm label of a request whose verification failed, or None if it cannot be told."""
+    try:
+        return _metrics.algorithm_label(parse_signature_params(headers['authorization']).algorithm)
+    except (KeyError, HttpSigException):
+        return None
+
+# SignatureVerifier engines built inside verify_many worker processes, by policy
+_worker_engines = LRUCache(maxsize=8)
+
+def _verify_chunk(policy, chunk):
+    engine = _worker_engines.get(policy)
+    if engine is None:
+        from .keystore import KeyStore
+        keys, required_headers, algorithms = policy
+        engine = SignatureVerifier(KeyStore(dict(keys)), required_headers, algorithms)
+        _worker_engines.set(policy, engine)
+
+    results = []
+    for item in chunk:
+        headers, method, path, host = item + (None,) * (4 - len(item))
+        try:
+            results.append(engine.verify(headers, method, path, host))
+        except Exception as e:
+            results.append(e)
+    return results
+
+def verify_many(requests, keys, required_headers=None, algorithms=None, executor=None, max_workers=None, chunksize=64):
+    """
+    Verify a batch of requests across a pool of processes.
+
+    requests is an iterable of (headers, method, path, host) tuples, as for SignatureVerifier.verify.
+    keys is a mapping of keyId to secret (or to (secret, algorithm)), as for KeyStore.
+    required_headers and algorithms are the SignatureVerifier policy.
+    executor is an optional concurrent.futures.ProcessPoolExecutor to run on; reusing one
+    across calls keeps the keys imported in its workers. Otherwise a pool of max_workers
+    processes is created for this call.
+    chunksize is the number of requests sent to a worker at a time.
+
+    Returns a list in the order of requests holding, for each request, True (pass),
+    False (fail), or the exception raised while verifying it (error).
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    policy = (tuple(sorted(keys.items())),
+              tuple(required_headers) if required_headers else None,
+              tuple(sorted(algorithms)) if algorithms else None)
+    requests = list(requests)
+    chunks = [requests[i:i + chunksize] for i in range(0, len(requests), chunksize)]
+
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=max_workers)
+    try:
+        results = []
+        for chunk_results in executor.map(_verify_chunk, [policy] * len(chunks), chunks):
+            results.extend(chunk_results)
+        return results
+    finally:
+        if own_executor:
+            executor.shutdown()
@@ -38,5 +38,6 @@ setup(
     include_package_data=True,
     zip_safe=True,
     install_requires=['pycrypto'],
+    extras_require={'cryptography': ['cryptography'], 'prometheus': ['prometheus_client']},
     test_suite="httpsig.tests",
 )